@@ -0,0 +1,158 @@
+"""Fingerprinted, precompressed static assets.
+
+Build them (the Docker image does this) with:
+
+uv run python -m rose.assets
+
+Every file under static/ is copied to static/dist/ under a name carrying a
+hash of its content, next to .gz and .br (when brotli is installed)
+siblings, and listed in static/dist/manifest.json. Templates link assets
+through static_url(), which returns the fingerprinted URL once built, so
+those URLs can be cached for a year: a changed file gets a new name.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import shutil
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+from .compression import COMPRESSIBLE, accepted_encodings, brotli
+
+logger = logging.getLogger("rose")
+
+STATIC_DIR = Path(os.environ.get("STATIC_DIR", "static"))
+DIST = "dist"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# ── Build ─────────────────────────────────────────────────────────────────────
+
+
+def _fingerprinted(path: Path, data: bytes) -> Path:
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return path.with_name(f"{path.stem}.{digest}{path.suffix}")
+
+
+def _compressible(path: Path) -> bool:
+    media_type, _ = mimetypes.guess_type(path.name)
+    return media_type in COMPRESSIBLE
+
+
+def build(static_dir: Path = STATIC_DIR) -> dict[str, str]:
+    """Write the fingerprinted copies and their compressed siblings, drop
+    the ones left over from earlier builds, and return the new manifest."""
+    dist = static_dir / DIST
+    manifest: dict[str, str] = {}
+    written: set[Path] = set()
+    for source in sorted(static_dir.rglob("*")):
+        relative = source.relative_to(static_dir)
+        if not source.is_file() or relative.parts[0] == DIST:
+            continue
+        data = source.read_bytes()
+        target = dist / _fingerprinted(relative, data)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if not target.exists():
+            shutil.copyfile(source, target)
+        written.add(target)
+        if _compressible(relative):
+            variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                variants[".br"] = brotli.compress(data, quality=11)
+            for suffix, compressed in variants.items():
+                # Not worth a sibling if compression gains nothing.
+                if len(compressed) < len(data):
+                    sibling = target.with_name(target.name + suffix)
+                    sibling.write_bytes(compressed)
+                    written.add(sibling)
+        manifest[relative.as_posix()] = target.relative_to(static_dir).as_posix()
+    if dist.exists():
+        for stale in dist.rglob("*"):
+            if stale.is_file() and stale not in written:
+                stale.unlink()
+    dist.mkdir(exist_ok=True)
+    (dist / "manifest.json").write_text(json.dumps(manifest, indent=2) + "\n")
+    return manifest
+
+
+# ── URLs ──────────────────────────────────────────────────────────────────────
+
+_manifest: dict[str, str] = {}
+
+
+def load_manifest(static_dir: Path = STATIC_DIR) -> None:
+    """Read the manifest written by build(). Without one, static_url() falls
+    back to the plain paths, which are served with revalidation."""
+    global _manifest
+    try:
+        _manifest = json.loads((static_dir / DIST / "manifest.json").read_text())
+    except FileNotFoundError:
+        _manifest = {}
+        logger.info("No static asset manifest; run `python -m rose.assets`")
+
+
+def static_url(path: str) -> str:
+    """The URL to link `path` (relative to static/) by."""
+    return f"/static/{_manifest.get(path, path)}"
+
+
+# ── Serving ───────────────────────────────────────────────────────────────────
+
+
+class AssetFiles(StaticFiles):
+    """StaticFiles that serves a precompressed sibling when the client
+    accepts it, and marks fingerprinted files immutable."""
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        path = Path(full_path)
+        media_type = mimetypes.guess_type(path.name)[0] or "text/plain"
+        headers = {
+            "Cache-Control": IMMUTABLE if DIST in path.parts else REVALIDATE,
+        }
+        if _compressible(path):
+            headers["Vary"] = "Accept-Encoding"
+            for coding in accepted_encodings(
+                request_headers.get("accept-encoding", "")
+            ):
+                sibling = path.with_name(path.name + _SUFFIXES[coding])
+                if sibling.is_file():
+                    path, stat_result = sibling, sibling.stat()
+                    headers["Content-Encoding"] = coding
+                    break
+        response = FileResponse(
+            path,
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            stat_result=stat_result,
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def main() -> None:
+    manifest = build()
+    print(f"{len(manifest)} static assets built into {STATIC_DIR / DIST}")
+
+
+if __name__ == "__main__":
+    main()
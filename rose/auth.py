@@ -1,11 +1,13 @@
 import hashlib
+import os
 import secrets
-from typing import Optional
+from dataclasses import dataclass
 
 from fastapi import Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 
-from .database import get_db
+from .cache import TTLCache, on_write
+from .database import DbSession, get_db, run
 from .models import User
 
 # ── Password helpers ──────────────────────────────────────────────────────────
@@ -26,32 +28,77 @@ def verify_password(password: str, stored: str) -> bool:
         return False
 
 
+# ── Principal cache ───────────────────────────────────────────────────────────
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The signed-in user as seen by request handlers and templates: a plain,
+    immutable snapshot of the User columns they read."""
+
+    id: int
+    name: str
+    surname: str
+    email: str
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(user.id, user.name, user.surname, user.email, user.is_admin)
+
+
+# Looked up on nearly every request, so principals are cached per process.
+# routers/users.py invalidates an entry whenever that user changes; a write
+# to users seen from another worker (or a script) empties the whole cache,
+# and the TTL bounds staleness if the versions are not being read.
+principals = TTLCache(
+    "principals",
+    maxsize=int(os.environ.get("AUTH_CACHE_SIZE", "1024")),
+    ttl=float(os.environ.get("AUTH_CACHE_TTL", "60")),
+)
+on_write("users", principals.clear)
+
+
+def _load_principal(db: Session, user_id: int) -> Principal | None:
+    user = db.get(User, user_id)
+    return Principal.from_user(user) if user else None
+
+
+def invalidate_principal(user_id: int) -> None:
+    principals.invalidate(user_id)
+
+
 # ── Session helpers ───────────────────────────────────────────────────────────
 
 
-def get_current_user(request: Request, db: Session) -> Optional[User]:
+async def get_current_user(request: Request, db: DbSession) -> Principal | None:
     """Read the logged-in user from the signed session cookie.
     Pass db explicitly; not a FastAPI dependency itself."""
     user_id = request.session.get("user_id")
     if not user_id:
         return None
-    return db.get(User, user_id)
+    principal = principals.get(user_id)
+    if principal is None:
+        principal = await run(db, _load_principal, user_id)
+        if principal is not None:
+            principals.set(user_id, principal)
+    return principal
 
 
 # ── FastAPI dependencies ──────────────────────────────────────────────────────
 
 
-def require_login(request: Request, db: Session = Depends(get_db)) -> User:
+async def require_login(request: Request, db: DbSession = Depends(get_db)) -> Principal:
     """Dependency for API routes: raises HTTP 401 if not authenticated."""
-    user = get_current_user(request, db)
+    user = await get_current_user(request, db)
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     return user
 
 
-def require_admin(request: Request, db: Session = Depends(get_db)) -> User:
+async def require_admin(request: Request, db: DbSession = Depends(get_db)) -> Principal:
     """Dependency for API routes: raises HTTP 403 if not an admin."""
-    user = require_login(request, db)
+    user = await require_login(request, db)
     if not user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
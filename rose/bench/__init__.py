@@ -0,0 +1 @@
+"""Benchmarks. Each module is runnable with `python -m rose.bench.<name>`."""
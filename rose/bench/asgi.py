@@ -0,0 +1,135 @@
+"""Minimal in-process ASGI client: drives the real app without sockets, so
+benchmarks measure the application rather than the network stack."""
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from http.cookies import SimpleCookie
+from typing import Any
+from urllib.parse import urlencode, urlsplit
+
+
+class Response:
+    def __init__(self, status: int, headers: list[tuple[bytes, bytes]], body: bytes):
+        self.status = status
+        self.headers = {k.decode().lower(): v.decode() for k, v in headers}
+        self.raw_headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class Client:
+    def __init__(self, app):
+        self.app = app
+        self.cookies: dict[str, str] = {}
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        *,
+        json_body: Any = None,
+        form: dict | None = None,
+        headers: dict[str, str] | None = None,
+    ) -> Response:
+        url = urlsplit(path)
+        hdrs = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+        body = b""
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            hdrs.append((b"content-type", b"application/json"))
+        elif form is not None:
+            body = urlencode(form).encode()
+            hdrs.append((b"content-type", b"application/x-www-form-urlencoded"))
+        hdrs.append((b"content-length", str(len(body)).encode()))
+        scope = self._scope(method, url, hdrs)
+        sent = False
+        status, resp_headers, chunks = 0, [], []
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                return {"type": "http.disconnect"}
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            nonlocal status, resp_headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                resp_headers = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        for k, v in resp_headers:
+            if k.lower() == b"set-cookie":
+                for name, morsel in SimpleCookie(v.decode()).items():
+                    self.cookies[name] = morsel.value
+        return Response(status, resp_headers, b"".join(chunks))
+
+    def _scope(self, method: str, url, hdrs: list[tuple[bytes, bytes]]) -> dict:
+        if self.cookies:
+            cookie = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+            hdrs.append((b"cookie", cookie.encode()))
+        hdrs.append((b"host", b"bench"))
+        return {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": url.path,
+            "raw_path": url.path.encode(),
+            "query_string": url.query.encode(),
+            "root_path": "",
+            "headers": hdrs,
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+        }
+
+    async def stream(self, path: str, on_chunk, closed: asyncio.Event) -> int:
+        """GET a streaming response, awaiting on_chunk(bytes) for each body
+        chunk, until the response ends or `closed` is set (the client
+        disconnects). Returns the status code."""
+        scope = self._scope("GET", urlsplit(path), [])
+        requested = False
+        status = 0
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await closed.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                await on_chunk(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return status
+
+    async def get(self, path: str, **kwargs) -> Response:
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path: str, **kwargs) -> Response:
+        return await self.request("POST", path, **kwargs)
+
+    async def login(self, email: str, password: str) -> None:
+        r = await self.post("/login", form={"email": email, "password": password})
+        if r.status != 302:
+            raise RuntimeError(f"Login failed with HTTP {r.status}")
+
+
+@asynccontextmanager
+async def running(app):
+    """Run the app's lifespan (migrations, seeding) around a benchmark."""
+    async with app.router.lifespan_context(app):
+        yield
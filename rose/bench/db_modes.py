@@ -0,0 +1,137 @@
+"""Compare the sync (threadpool) and async (aiosqlite) database modes.
+
+    uv run python -m rose.bench.db_modes --concurrency 1 16 64 256
+
+Each mode runs in its own subprocess (the mode is fixed at import time)
+against the same seeded database. Prints throughput and latency
+percentiles per concurrency level as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROUTES = ["/", "/api/books/", "/books/{book}", "/partials/books?q=rose"]
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    return round(samples[min(len(samples) - 1, int(len(samples) * pct))], 3)
+
+
+def _seed(engine, books: int, feedbacks: int) -> None:
+    rng = random.Random(7)
+    with engine.begin() as conn:
+        if conn.exec_driver_sql("SELECT COUNT(*) FROM books").scalar():
+            return
+        conn.exec_driver_sql(
+            "INSERT INTO books (title, author, created_at) "
+            "VALUES (?, ?, CURRENT_TIMESTAMP)",
+            [(f"Rose {i}", f"Author {i % 500}") for i in range(books)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO feedbacks (user_id, book_id, rating, review, created_at) "
+            "VALUES (1, ?, ?, ?, CURRENT_TIMESTAMP)",
+            [
+                (rng.randint(1, books), rng.randint(0, 10), "A fine read. " * 20)
+                for _ in range(feedbacks)
+            ],
+        )
+
+
+async def _level(client, concurrency: int, requests: int, write_ratio: float):
+    rng = random.Random(concurrency)
+    latencies: list[float] = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with sem:
+            start = time.perf_counter()
+            if rng.random() < write_ratio:
+                r = await client.post(
+                    "/api/feedbacks/",
+                    json_body={"user_id": 1, "book_id": rng.randint(1, 100)},
+                )
+            else:
+                path = rng.choice(ROUTES).format(book=rng.randint(1, 100))
+                r = await client.get(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if r.status >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": _percentile(latencies, 0.50),
+        "p99_ms": _percentile(latencies, 0.99),
+    }
+
+
+async def _worker(args) -> list[dict]:
+    from ..database import engine
+    from ..main import app
+    from .asgi import Client, running
+
+    async with running(app):
+        _seed(engine, args.books, args.feedbacks)
+        client = Client(app)
+        await client.login(
+            os.environ.get("ADMIN_EMAIL", "admin@rose.local"),
+            os.environ.get("ADMIN_PASSWORD", "changeme"),
+        )
+        return [
+            await _level(client, c, args.requests, args.write_ratio)
+            for c in args.concurrency
+        ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--books", type=int, default=5000)
+    parser.add_argument("--feedbacks", type=int, default=20000)
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(_worker(args))))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("sync", "async"):
+            env = dict(
+                os.environ,
+                DB_PATH=os.path.join(tmp, "bench.db"),
+                DB_ASYNC="1" if mode == "async" else "0",
+                SECRET_KEY="bench",
+            )
+            out = subprocess.run(
+                [sys.executable, "-m", "rose.bench.db_modes", "--worker"]
+                + sys.argv[1:],
+                env=env,
+                check=True,
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            results[mode] = json.loads(out.stdout.splitlines()[-1])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Hold many idle /events subscribers on one worker and measure fan-out.
+
+    uv run python -m rose.bench.events --subscribers 1000 --writes 100
+
+Opens the subscriptions in-process against a throwaway database, all
+following one book, plus one subscriber that stops reading. Then it adds
+feedbacks to the book one at a time and waits for every subscriber to
+receive each change. Reports memory per idle subscriber, write latency and
+the time until the last subscriber has the change, and checks that the
+stalled subscriber was dropped and that no subscription outlives its
+client. Prints JSON; exits with status 1 if a check fails.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(len(samples) * pct))], 3)
+
+
+async def _run(args) -> dict:
+    from .. import events
+    from ..main import app
+    from .asgi import Client, running
+
+    async with running(app):
+        client = Client(app)
+        await client.login(
+            os.environ.get("ADMIN_EMAIL", "admin@rose.local"),
+            os.environ["ADMIN_PASSWORD"],
+        )
+        book = (
+            await client.post(
+                "/api/books/", json_body={"title": "Rose", "author": "Eco"}
+            )
+        ).json()
+        path = f"/events?book_id={book['id']}"
+
+        received = [0] * args.subscribers
+        progress = asyncio.Condition()
+        closed = asyncio.Event()
+
+        def counter(i: int):
+            async def on_chunk(chunk: bytes) -> None:
+                if chunk.startswith(b"event: message"):
+                    received[i] += 1
+                    async with progress:
+                        progress.notify_all()
+
+            return on_chunk
+
+        async def never_reads(chunk: bytes) -> None:
+            await closed.wait()
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        tasks = [
+            asyncio.create_task(client.stream(path, counter(i), closed))
+            for i in range(args.subscribers)
+        ]
+        tasks.append(asyncio.create_task(client.stream(path, never_reads, closed)))
+        while len(events.bus) < args.subscribers + 1:
+            await asyncio.sleep(0.01)
+        opened = time.perf_counter() - start
+        per_subscriber = (tracemalloc.get_traced_memory()[0] - before) / (
+            args.subscribers + 1
+        )
+        tracemalloc.stop()
+
+        write_ms, fanout_ms = [], []
+        for n in range(1, args.writes + 1):
+            start = time.perf_counter()
+            r = await client.post(
+                "/api/feedbacks/",
+                json_body={"user_id": 1, "book_id": book["id"], "rating": n % 11},
+            )
+            if r.status != 201:
+                raise RuntimeError(f"POST /api/feedbacks/ returned HTTP {r.status}")
+            write_ms.append((time.perf_counter() - start) * 1000)
+            async with progress:
+                await progress.wait_for(lambda: min(received) >= n)
+            fanout_ms.append((time.perf_counter() - start) * 1000)
+
+        stats = events.bus.stats()
+        closed.set()
+        await asyncio.gather(*tasks)
+        leaked = len(events.bus)
+
+    return {
+        "subscribers": args.subscribers,
+        "writes": args.writes,
+        "open_all_ms": round(opened * 1000, 1),
+        "kib_per_idle_subscriber": round(per_subscriber / 1024, 2),
+        "write_p50_ms": _percentile(write_ms, 0.50),
+        "write_p99_ms": _percentile(write_ms, 0.99),
+        "all_delivered_p50_ms": _percentile(fanout_ms, 0.50),
+        "all_delivered_p99_ms": _percentile(fanout_ms, 0.99),
+        "stalled_dropped": stats["dropped"] == 1,
+        "subscriptions_leaked": leaked,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--writes", type=int, default=100)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DB_PATH"] = os.path.join(tmp, "events.db")
+    os.environ.setdefault("SECRET_KEY", "events")
+    os.environ.setdefault("ADMIN_PASSWORD", "changeme")
+    os.environ.setdefault("RECOMMENDATIONS_INTERVAL", "0")
+    # The stalled subscriber must overflow its queue within the run.
+    os.environ.setdefault("EVENTS_QUEUE_SIZE", str(min(64, args.writes // 2)))
+
+    result = asyncio.run(_run(args))
+    print(json.dumps(result, indent=2))
+    ok = result["stalled_dropped"] and not result["subscriptions_leaked"]
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Check that every query the routers issue is served by an index.
+
+    uv run python -m rose.bench.query_plans
+
+Drives each page, partial and API route in-process against a seeded
+database, records the SELECT statements they issue and runs EXPLAIN QUERY
+PLAN on each. Before that, on a database small enough for every row to fit
+on one page, it checks that the listing and detail routes in _CONSTANT
+issue as many statements with twice the rows, so rendering more rows never
+costs a query per row. Exits with status 1 if any statement
+scans a table without an index or sorts through a temporary B-tree, or if
+any of those counts changed. Nothing runs it automatically; it is a manual
+check to run before merging changes to queries, routes or templates.
+"""
+
+import asyncio
+import os
+import re
+import sys
+import tempfile
+
+# Plan lines that mean the query does work proportional to the table size.
+_BAD_PLAN = re.compile(
+    r"^SCAN (?!.*\b(?:USING (?:COVERING )?INDEX|VIRTUAL TABLE)\b)" r"|USE TEMP B-TREE"
+)
+
+# Schema lookups and connection pragmas, which read no table rows. Startup
+# statements (the admin seed's count) run before recording begins.
+_IGNORED = re.compile(r"sqlite_master|PRAGMA", re.IGNORECASE)
+
+
+def _routes(book_id: int, user_id: int) -> list[str]:
+    return [
+        "/",
+        "/books",
+        f"/books/{book_id}",
+        "/users",
+        f"/users/{user_id}",
+        "/feedbacks",
+        "/partials/books",
+        "/partials/books?q=rose",
+        "/partials/users",
+        "/partials/users?q=ada",
+        "/partials/user-options?q=ada rea",
+        "/partials/feedbacks",
+        f"/partials/books/{book_id}/feedbacks",
+        f"/partials/users/{user_id}/feedbacks",
+        "/api/books/",
+        "/api/books/?sort=rating",
+        f"/api/books/{book_id}",
+        f"/api/books/{book_id}/similar",
+        "/api/feedbacks/",
+        "/api/users/",
+        f"/api/users/{user_id}",
+        "/api/search/?q=rose",
+        "/api/sync/",
+        "/api/stats",
+        f"/api/users/{user_id}/stats",
+    ]
+
+
+# Routes whose statement count must not depend on how many rows there are.
+_CONSTANT = ["/api/feedbacks/", "/feedbacks", "/books/{book_id}", "/users/{user_id}"]
+_COUNT_ROWS = 10
+
+
+def _seed_rows(engine, n: int) -> None:
+    """Add n users and n books, and a feedback from each new user on book 1
+    and from user 2 on each new book: 2n feedbacks, all shown by _CONSTANT.
+    The transaction begins IMMEDIATE: it reads before writing, and the app's
+    startup tasks may be writing too."""
+    with engine.execution_options(sqlite_begin="IMMEDIATE").begin() as conn:
+        users = conn.exec_driver_sql("SELECT COALESCE(MAX(id), 0) FROM users").scalar()
+        books = conn.exec_driver_sql("SELECT COALESCE(MAX(id), 0) FROM books").scalar()
+        conn.exec_driver_sql(
+            "INSERT INTO users (name, surname, email, password, is_admin) "
+            "VALUES (?, ?, ?, 'x', 0)",
+            [
+                (f"Cy{i}", f"Counter{i}", f"cy{i}@rose.local")
+                for i in range(users, users + n)
+            ],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO books (title, author, created_at) "
+            "VALUES (?, ?, CURRENT_TIMESTAMP)",
+            [(f"Count {i}", f"Author {i}") for i in range(books, books + n)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO feedbacks (user_id, book_id, rating, created_at) "
+            "VALUES (?, ?, 5, CURRENT_TIMESTAMP)",
+            [(users + 1 + i, 1) for i in range(n)]
+            + [(2, books + 1 + i) for i in range(n)],
+        )
+
+
+def _seed(engine) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO users (name, surname, email, password, is_admin) "
+            "VALUES (?, ?, ?, 'x', 0)",
+            [(f"Ada{i}", f"Reader{i}", f"ada{i}@rose.local") for i in range(200)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO books (title, author, created_at) "
+            "VALUES (?, ?, CURRENT_TIMESTAMP)",
+            [(f"Rose {i}", f"Author {i % 50}") for i in range(2000)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO feedbacks (user_id, book_id, rating, review, created_at) "
+            "VALUES (?, ?, 5, 'A rose of a book', CURRENT_TIMESTAMP)",
+            [(2 + i % 200, 1 + i % 2000) for i in range(5000)],
+        )
+
+
+async def _statement_counts(client, engine) -> dict[str, int]:
+    from sqlalchemy import event
+
+    from ..cache import poll
+
+    # Take in the rows just seeded now, rather than have the background poll
+    # empty the signed-in user cache in the middle of a measurement.
+    poll()
+    counts = {}
+    current = [None]
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if current[0] is not None:
+            counts[current[0]] += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        for route in _CONSTANT:
+            path = route.format(book_id=1, user_id=2)
+            # The first request may still fill caches (the signed-in user).
+            current[0] = None
+            await client.get(path)
+            current[0], counts[route] = route, 0
+            r = await client.get(path)
+            if r.status >= 400:
+                raise RuntimeError(f"GET {path} returned HTTP {r.status}")
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return counts
+
+
+async def _collect() -> tuple[list[tuple[str, str, tuple]], list[dict[str, int]]]:
+    from sqlalchemy import event
+
+    from .. import recommendations
+    from ..database import engine
+    from ..main import app
+    from .asgi import Client, running
+
+    statements: list[tuple[str, str, tuple]] = []
+    current = [""]
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            statements.append((current[0], statement, parameters))
+
+    async with running(app):
+        client = Client(app)
+        await client.login("admin@rose.local", os.environ["ADMIN_PASSWORD"])
+        # 2 * _COUNT_ROWS and then 4 * _COUNT_ROWS feedbacks: under a page.
+        counts = []
+        for _ in range(2):
+            _seed_rows(engine, _COUNT_ROWS)
+            counts.append(await _statement_counts(client, engine))
+        _seed(engine)
+        recommendations.build(engine, force=True)
+        first = await client.get("/api/feedbacks/?limit=2")
+        synced = await client.get("/api/sync/?limit=2")
+        event.listen(engine, "before_cursor_execute", record)
+        paths = _routes(book_id=1, user_id=2)
+        paths.append(f"/api/feedbacks/?cursor={first.headers['x-next-cursor']}")
+        paths.append(f"/api/feedbacks/{first.json()[0]['id']}")
+        paths.append(f"/api/sync/?since={synced.json()['cursor']}")
+        for path in paths:
+            current[0] = path
+            r = await client.get(path)
+            if r.status >= 400:
+                raise RuntimeError(f"GET {path} returned HTTP {r.status}")
+        event.remove(engine, "before_cursor_execute", record)
+    return statements, counts
+
+
+def main() -> None:
+    tmp = tempfile.mkdtemp()
+    os.environ["DB_PATH"] = os.path.join(tmp, "plans.db")
+    os.environ["DB_ASYNC"] = "0"
+    os.environ.setdefault("SECRET_KEY", "plans")
+    os.environ.setdefault("ADMIN_PASSWORD", "changeme")
+
+    statements, (before, after) = asyncio.run(_collect())
+
+    from ..database import engine
+
+    failures = 0
+    seen = set()
+    with engine.connect() as conn:
+        for path, statement, parameters in statements:
+            if _IGNORED.search(statement) or statement in seen:
+                continue
+            seen.add(statement)
+            plan = [
+                row[3]
+                for row in conn.exec_driver_sql(
+                    f"EXPLAIN QUERY PLAN {statement}", parameters
+                )
+            ]
+            bad = [line for line in plan if _BAD_PLAN.search(line)]
+            if bad:
+                failures += 1
+                print(f"FAIL {path}\n  {' '.join(statement.split())}")
+                for line in plan:
+                    print(f"    {line}")
+    print(f"{len(seen)} distinct statements checked, {failures} failing")
+
+    grew = 0
+    for route in _CONSTANT:
+        if before[route] != after[route]:
+            grew += 1
+            print(
+                f"FAIL {route}: {before[route]} statements, "
+                f"{after[route]} with twice the rows"
+            )
+    print(f"{len(_CONSTANT)} routes' statement counts checked, {grew} changed")
+    sys.exit(1 if failures or grew else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Measure the time and memory of a recommendations build.
+
+uv run python -m rose.bench.recommendations --users 100000 --books 50000
+
+Seeds a throwaway database with a long-tailed feedback matrix (a few books
+read by many, most by few), then runs one full build. Prints the build time,
+the process's peak resident memory and the neighbour rows written as JSON.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+
+from .. import recommendations
+from ..models import create_tables
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _seed(engine, users: int, books: int, per_user: int) -> int:
+    rng = random.Random(15)
+    # Zipf-like popularity: book i is drawn with weight 1 / (i + 10).
+    cum_weights = list(itertools.accumulate(1 / (i + 10) for i in range(books)))
+    ids = range(1, books + 1)
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO users (name, surname, email, password, is_admin) "
+            "VALUES (?, ?, ?, 'x', 0)",
+            [(f"Ada{i}", f"Reader{i}", f"ada{i}@rose.local") for i in range(users)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO books (title, author) VALUES (?, ?)",
+            [(f"Rose {i}", f"Author {i % 5000}") for i in range(books)],
+        )
+        feedbacks = 0
+        for first in range(1, users + 1, 10_000):
+            rows = []
+            for user_id in range(first, min(first + 10_000, users + 1)):
+                read = set(rng.choices(ids, cum_weights=cum_weights, k=per_user))
+                rows.extend(
+                    (user_id, book_id, rng.choice((None, *range(11))))
+                    for book_id in read
+                )
+            conn.exec_driver_sql(
+                "INSERT INTO feedbacks (user_id, book_id, rating, created_at) "
+                "VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+                rows,
+            )
+            feedbacks += len(rows)
+    return feedbacks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--books", type=int, default=50_000)
+    parser.add_argument("--per-user", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        create_tables(engine)
+        start = time.perf_counter()
+        feedbacks = _seed(engine, args.users, args.books, args.per_user)
+        seeded = time.perf_counter() - start
+        rss_before = _peak_rss_mb()
+
+        start = time.perf_counter()
+        recommendations.build(engine, force=True)
+        built = time.perf_counter() - start
+        with engine.connect() as conn:
+            neighbours = conn.exec_driver_sql(
+                "SELECT COUNT(*) FROM book_neighbours"
+            ).scalar()
+        engine.dispose()
+
+    print(
+        json.dumps(
+            {
+                "users": args.users,
+                "books": args.books,
+                "feedbacks": feedbacks,
+                "seed_s": round(seeded, 1),
+                "build_s": round(built, 1),
+                "neighbours": neighbours,
+                "peak_rss_mb_before_build": rss_before,
+                "peak_rss_mb": _peak_rss_mb(),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
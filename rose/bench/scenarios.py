@@ -0,0 +1,347 @@
+"""Drive the app with scripted reader sessions and report latency per route.
+
+    uv run python -m rose.bench.scenarios --clients 32 --duration 30 --out run.json
+    uv run python -m rose.bench.scenarios --baseline run.json
+
+Seeds a throwaway database with rose.bench.seed (or uses --db as it is),
+then runs closed-loop virtual clients against the real app in-process. Each
+client signs in as its own reader and repeatedly plays a scenario drawn
+from the mix:
+
+- browse: the home page, the book list and a few "load more" pages;
+- search: types a title into the book search box a letter at a time;
+- book_detail: opens a book page, popular books more often;
+- add_feedback: opens a book, finds itself in the user picker and posts a
+  review the way the htmx form does.
+
+Anonymous clients (--anonymous) never add feedback. Requests made during
+--warmup are not counted. Prints JSON with throughput and p50/p95/p99 per
+route and per scenario; with --baseline, also each route's change against
+an earlier run's output.
+"""
+
+import argparse
+import asyncio
+import functools
+import html
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+from sqlalchemy import create_engine
+
+from . import seed
+
+MIX = {"browse": 4, "search": 3, "book_detail": 4, "add_feedback": 1}
+
+_MORE = re.compile(r'hx-get="(/partials/books\?cursor=[^"]+)"')
+_HX = {"HX-Request": "true"}
+
+
+@functools.cache
+def _weights(books: int) -> list[float]:
+    return seed.popularity(books)
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    return round(samples[min(len(samples) - 1, int(len(samples) * pct))], 3)
+
+
+def _summary(samples: list[float], errors: int, elapsed: float) -> dict:
+    samples = sorted(samples)
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "rps": round(len(samples) / elapsed, 1),
+        "p50_ms": _percentile(samples, 0.50),
+        "p95_ms": _percentile(samples, 0.95),
+        "p99_ms": _percentile(samples, 0.99),
+        "max_ms": round(samples[-1], 3),
+    }
+
+
+class Recorder:
+    """Latency samples and error counts by route; off during warm-up."""
+
+    def __init__(self):
+        self.on = False
+        self.samples: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    def add(self, name: str, ms: float, ok: bool) -> None:
+        if not self.on:
+            return
+        self.samples.setdefault(name, []).append(ms)
+        if not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        return {
+            name: _summary(samples, self.errors.get(name, 0), elapsed)
+            for name, samples in sorted(self.samples.items())
+        }
+
+
+class Reader:
+    """One virtual client: an ASGI client with its own session cookie."""
+
+    def __init__(self, client, rng: random.Random, books: range, routes: Recorder):
+        self.client = client
+        self.rng = rng
+        self.books = books
+        self.routes = routes
+        # Set once signed in; anonymous readers keep None.
+        self.user_id: int | None = None
+        self.name = ""
+
+    async def get(self, route: str, path: str, **kwargs):
+        start = time.perf_counter()
+        r = await self.client.get(path, **kwargs)
+        self.routes.add(
+            f"GET {route}", (time.perf_counter() - start) * 1000, r.status < 400
+        )
+        return r
+
+    async def post(self, route: str, path: str, **kwargs):
+        start = time.perf_counter()
+        r = await self.client.post(path, **kwargs)
+        self.routes.add(
+            f"POST {route}", (time.perf_counter() - start) * 1000, r.status < 400
+        )
+        return r
+
+    def book(self) -> int:
+        return self.rng.choices(self.books, cum_weights=_weights(len(self.books)))[0]
+
+    # ── Scenarios ─────────────────────────────────────────────────────────────
+
+    async def browse(self) -> None:
+        await self.get("/", "/")
+        r = await self.get("/books", "/books")
+        for _ in range(self.rng.randint(1, 3)):
+            more = _MORE.search(r.body.decode())
+            if not more:
+                break
+            r = await self.get(
+                "/partials/books?cursor=", html.unescape(more.group(1)), headers=_HX
+            )
+
+    async def search(self) -> None:
+        title = " ".join(self.rng.sample(seed.WORDS, self.rng.randint(1, 2)))
+        # Typing fires a request per keystroke from the second letter on.
+        for end in range(2, len(title) + 1):
+            if title[end - 1] == " ":
+                continue
+            await self.get(
+                "/partials/books?q=",
+                f"/partials/books?{urlencode({'q': title[:end]})}",
+                headers=_HX,
+            )
+
+    async def book_detail(self) -> None:
+        await self.get("/books/{id}", f"/books/{self.book()}")
+
+    async def add_feedback(self) -> None:
+        book_id = self.book()
+        await self.get("/books/{id}", f"/books/{book_id}")
+        for end in (2, 3):
+            await self.get(
+                "/partials/user-options?q=",
+                f"/partials/user-options?q={self.name[:end]}",
+                headers=_HX,
+            )
+        await self.post(
+            "/api/feedbacks/",
+            "/api/feedbacks/",
+            json_body={
+                "user_id": self.user_id,
+                "book_id": book_id,
+                "rating": self.rng.randint(0, 10),
+                "review": "A slow start, then I could not put it down. " * 4,
+            },
+            headers=_HX,
+        )
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+async def _run(args, seeded: dict) -> dict:
+    from ..database import DB_ASYNC
+    from ..main import app
+    from .asgi import Client, running
+
+    first_user, last_user = seeded["users"]
+    first_book, last_book = seeded["books"]
+    books = range(first_book, last_book + 1)
+    mix = {name: MIX[name] for name in args.scenario}
+    routes, scenarios = Recorder(), Recorder()
+
+    async with running(app):
+        readers = []
+        for i in range(args.clients):
+            reader = Reader(Client(app), random.Random(i), books, routes)
+            if i >= args.clients * args.anonymous:
+                user_id = first_user + i % (last_user - first_user + 1)
+                await reader.client.login(f"reader{user_id}@rose.local", seed.PASSWORD)
+                me = (await reader.client.get("/api/users/me")).json()
+                reader.user_id, reader.name = me["id"], me["name"]
+            readers.append(reader)
+
+        stop = time.perf_counter() + args.warmup + args.duration
+
+        async def loop(reader: Reader) -> None:
+            choices = {
+                name: weight
+                for name, weight in mix.items()
+                if reader.user_id or name != "add_feedback"
+            }
+            if not choices:
+                return
+            while time.perf_counter() < stop:
+                name = reader.rng.choices(list(choices), list(choices.values()))[0]
+                start = time.perf_counter()
+                await getattr(reader, name)()
+                scenarios.add(name, (time.perf_counter() - start) * 1000, True)
+                if args.think:
+                    await asyncio.sleep(reader.rng.expovariate(1000 / args.think))
+
+        tasks = [asyncio.create_task(loop(reader)) for reader in readers]
+        await asyncio.sleep(args.warmup)
+        routes.on = scenarios.on = True
+        started = time.perf_counter()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+
+    every = [ms for samples in routes.samples.values() for ms in samples]
+    return {
+        "run": {
+            "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "db_async": DB_ASYNC,
+            "clients": args.clients,
+            "anonymous": args.anonymous,
+            "think_ms": args.think,
+            "warmup_s": args.warmup,
+            "duration_s": round(elapsed, 2),
+            "mix": mix,
+            "data": {
+                "users": last_user - first_user + 1,
+                "books": last_book - first_book + 1,
+                "feedbacks": seeded.get("feedbacks"),
+            },
+        },
+        "total": _summary(every, sum(routes.errors.values()), elapsed),
+        "routes": routes.report(elapsed),
+        "scenarios": {
+            name: {
+                "iterations": summary["requests"],
+                **{k: v for k, v in summary.items() if k not in ("requests", "errors")},
+            }
+            for name, summary in scenarios.report(elapsed).items()
+        },
+    }
+
+
+def _compare(result: dict, baseline: dict) -> dict:
+    """Ratios of this run to the baseline per route: below 1 is faster for
+    latencies, above 1 is more throughput."""
+
+    def ratios(now: dict, then: dict) -> dict:
+        return {
+            key: round(now[key] / then[key], 3) if then[key] else None
+            for key in ("rps", "p50_ms", "p95_ms", "p99_ms")
+        }
+
+    routes = {
+        name: ratios(summary, baseline["routes"][name])
+        for name, summary in result["routes"].items()
+        if name in baseline["routes"]
+    }
+    return {
+        "baseline": baseline["run"].get("revision"),
+        "total": ratios(result["total"], baseline["total"]),
+        "routes": routes,
+    }
+
+
+def _existing(engine) -> dict:
+    """The id ranges of the seeded readers and books in an existing database."""
+    with engine.connect() as conn:
+        users = conn.exec_driver_sql(
+            "SELECT MIN(id), MAX(id) FROM users WHERE email LIKE 'reader%@rose.local'"
+        ).one()
+        books = conn.exec_driver_sql("SELECT MIN(id), MAX(id) FROM books").one()
+        feedbacks = conn.exec_driver_sql("SELECT COUNT(*) FROM feedbacks").scalar()
+    if users[0] is None or books[0] is None:
+        raise SystemExit("No seeded readers in the database; run rose.bench.seed")
+    return {"users": list(users), "books": list(books), "feedbacks": feedbacks}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="use this seeded database instead")
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--books", type=int, default=5_000)
+    parser.add_argument("--feedbacks", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--anonymous", type=float, default=0.0, help="share 0-1")
+    parser.add_argument("--think", type=float, default=0.0, help="mean pause, ms")
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument(
+        "--scenario", action="append", choices=list(MIX), help="repeatable"
+    )
+    parser.add_argument("--baseline", help="an earlier run's JSON to compare to")
+    parser.add_argument("--out", help="also write the JSON to this file")
+    args = parser.parse_args()
+    args.scenario = args.scenario or list(MIX)
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ.setdefault("SECRET_KEY", "scenarios")
+    os.environ.setdefault("RECOMMENDATIONS_INTERVAL", "0")
+    os.environ["DB_PATH"] = args.db or os.path.join(tmp.name, "scenarios.db")
+    # Imported only now: the database module reads DB_PATH on import.
+    from ..models import create_tables
+
+    engine = create_engine(f"sqlite:///{os.environ['DB_PATH']}")
+    if args.db:
+        seeded = _existing(engine)
+    else:
+        create_tables(engine)
+        seeded = seed.seed(engine, args.users, args.books, args.feedbacks)
+    engine.dispose()
+
+    result = asyncio.run(_run(args, seeded))
+    if args.baseline:
+        with open(args.baseline) as f:
+            result["change"] = _compare(result, json.load(f))
+    tmp.cleanup()
+
+    out = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(out + "\n")
+    print(out)
+
+
+if __name__ == "__main__":
+    main()
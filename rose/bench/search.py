@@ -0,0 +1,80 @@
+"""Compare full-text search latency against the LIKE scan.
+
+uv run python -m rose.bench.search --books 100000
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from .. import search
+from ..models import create_tables
+
+WORDS = (
+    "rose name war peace night garden house river stone shadow light king "
+    "queen winter summer silent city sea star road glass fire iron secret"
+).split()
+QUERIES = ["ro", "gard", "shadow ki", "silent sea", "iron", "zzz"]
+
+
+def _seed(engine, n: int) -> None:
+    rng = random.Random(42)
+    rows = [
+        (
+            " ".join(rng.choices(WORDS, k=rng.randint(2, 5))).title(),
+            f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}son",
+        )
+        for _ in range(n)
+    ]
+    with engine.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO books (title, author) VALUES (?, ?)", rows)
+
+
+def _time(session, fn, q: str, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(session, q)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "p50_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1], 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        create_tables(engine)
+        _seed(engine, args.books)
+        search.create_search_index(engine)
+        session = sessionmaker(bind=engine)()
+
+        results = {}
+        for q in QUERIES:
+            search.fts_enabled = False
+            like = _time(session, search.search_books, q, args.repeat)
+            search.fts_enabled = True
+            fts = _time(session, search.search_books, q, args.repeat)
+            results[q] = {"like": like, "fts": fts}
+        session.close()
+        engine.dispose()
+
+    print(json.dumps({"books": args.books, "queries": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Bulk-load a database with realistic readers, books and feedbacks.
+
+    uv run python -m rose.bench.seed --users 10000 --books 5000 --feedbacks 200000
+
+Rows go in with executemany() in large batches. On a new database that is
+done before the app's triggers exist, so the first startup builds the search
+indexes, rating aggregates and statistics rollups in one set-based pass
+each instead of row by row. Book popularity is Zipf-like (a few books are
+read by many, most by few) and so is reader activity; review lengths are
+log-normal, and many feedbacks have no review or no rating. Every seeded
+reader signs in as reader<n>@rose.local with the same password. The app
+only creates its admin user in an empty users table, so seed a new database
+after its first startup if you need one.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine
+
+PASSWORD = "reader"
+BATCH = 10_000
+
+WORDS = (
+    "rose name war peace night garden house river stone shadow light king "
+    "queen winter summer silent city sea star road glass fire iron secret "
+    "letter island mountain daughter empire storm memory bridge orchard wolf"
+).split()
+PROSE = (
+    "the a of and to in it was that is with as for but this story book "
+    "characters plot ending slow beautiful read again loved hated pages "
+    "writing chapter author world felt never quite every moment dialogue "
+    "could would second half first translation recommend"
+).split()
+FIRST = "Ada Boris Clara Dario Elena Franco Greta Hugo Irene Jonas Karin Luca".split()
+LAST = "Rossi Novak Berg Costa Moreau Lind Ferri Weber Silva Horvat Dahl".split()
+
+
+def popularity(n: int) -> list[float]:
+    """Cumulative weights drawing the i-th of n items with weight
+    1 / (i + 10): the head is popular, the tail long."""
+    return list(itertools.accumulate(1 / (i + 10) for i in range(n)))
+
+
+def _review(rng: random.Random) -> str | None:
+    if rng.random() < 0.4:
+        return None
+    # Median around 45 words, with the occasional essay.
+    words = min(2000, max(1, int(rng.lognormvariate(3.8, 1.0))))
+    text = " ".join(rng.choices(PROSE, k=words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _max_id(conn, table: str) -> int:
+    return conn.exec_driver_sql(f"SELECT COALESCE(MAX(id), 0) FROM {table}").scalar()
+
+
+def seed(
+    engine,
+    users: int,
+    books: int,
+    feedbacks: int,
+    *,
+    rng_seed: int = 21,
+    password: str = PASSWORD,
+) -> dict:
+    """Append the given numbers of rows and return the id ranges used, so
+    callers can address them (book ids in popularity order)."""
+    from ..auth import hash_password
+
+    rng = random.Random(rng_seed)
+    hashed = hash_password(password)
+    # Naive UTC, as the models store it.
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    with engine.begin() as conn:
+        first_user = _max_id(conn, "users") + 1
+        first_book = _max_id(conn, "books") + 1
+        conn.exec_driver_sql(
+            "INSERT INTO users (name, surname, email, password, is_admin, "
+            "created_at, updated_at) VALUES (?, ?, ?, ?, 0, ?, ?)",
+            [
+                (
+                    rng.choice(FIRST),
+                    rng.choice(LAST),
+                    f"reader{first_user + i}@rose.local",
+                    hashed,
+                    str(now),
+                    str(now),
+                )
+                for i in range(users)
+            ],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO books (title, author, publishing_year, number_of_pages, "
+            "created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    " ".join(rng.choices(WORDS, k=rng.randint(1, 4))).title(),
+                    f"{rng.choice(FIRST)} {rng.choice(LAST)}",
+                    rng.randint(1850, 2026),
+                    int(rng.lognormvariate(5.7, 0.4)),
+                    str(now),
+                    str(now),
+                )
+                for _ in range(books)
+            ],
+        )
+        user_ids = range(first_user, first_user + users)
+        book_ids = range(first_book, first_book + books)
+        # Shuffle which readers are the most active; popular books keep the
+        # lowest ids so callers can draw from the same distribution.
+        readers = list(user_ids)
+        rng.shuffle(readers)
+        reader_weights, book_weights = popularity(users), popularity(books)
+        start = now - timedelta(days=3 * 365)
+        step = (now - start) / max(feedbacks, 1)
+        for first in range(0, feedbacks, BATCH):
+            rows = []
+            for i in range(first, min(first + BATCH, feedbacks)):
+                created = start + step * i
+                rows.append(
+                    (
+                        rng.choices(readers, cum_weights=reader_weights)[0],
+                        rng.choices(book_ids, cum_weights=book_weights)[0],
+                        None if rng.random() < 0.1 else rng.randint(0, 10),
+                        _review(rng),
+                        rng.choice((None, created.year)),
+                        str(created),
+                        str(created),
+                    )
+                )
+            conn.exec_driver_sql(
+                "INSERT INTO feedbacks (user_id, book_id, rating, review, "
+                "year_of_reading, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+    return {
+        "users": [first_user, first_user + users - 1],
+        "books": [first_book, first_book + books - 1],
+        "feedbacks": feedbacks,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=os.environ.get("DB_PATH", "rose.db"))
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--books", type=int, default=5_000)
+    parser.add_argument("--feedbacks", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=21)
+    args = parser.parse_args()
+
+    # Not imported at the top, so that importing this module leaves the
+    # app's database settings (read from DB_PATH on import) alone.
+    from ..models import create_tables
+
+    engine = create_engine(f"sqlite:///{args.db}")
+    create_tables(engine)
+    start = time.perf_counter()
+    ids = seed(engine, args.users, args.books, args.feedbacks, rng_seed=args.seed)
+    engine.dispose()
+    print(
+        json.dumps(
+            {"db": args.db, **ids, "seed_s": round(time.perf_counter() - start, 1)},
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Measure cold-start cost: app startup and the first request to each page.
+
+    uv run python -m rose.bench.startup --runs 5
+
+Every run is a fresh process, as after a deploy or worker restart. Three
+setups are compared: templates compiled lazily on first use (`lazy`),
+precompiled at startup with an empty bytecode cache (`cold_cache`, the
+first deploy) and with the cache left by the previous run (`warm_cache`,
+every restart after that). Prints median timings in milliseconds as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PAGES = [
+    "/login",
+    "/",
+    "/books",
+    "/books/1",
+    "/users",
+    "/users/2",
+    "/feedbacks",
+    "/partials/books",
+    "/partials/users",
+    "/partials/feedbacks",
+]
+
+
+def _seed(engine) -> None:
+    with engine.begin() as conn:
+        if conn.exec_driver_sql("SELECT COUNT(*) FROM books").scalar():
+            return
+        conn.exec_driver_sql(
+            "INSERT INTO users (name, surname, email, password, is_admin) "
+            "VALUES ('Ada', 'Reader', 'ada@rose.local', 'x', 0)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO books (title, author, created_at) "
+            "VALUES ('Rose', 'Eco', CURRENT_TIMESTAMP)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO feedbacks (user_id, book_id, rating, review, created_at) "
+            "VALUES (2, 1, 9, 'A rose of a book', CURRENT_TIMESTAMP)"
+        )
+
+
+async def _worker() -> dict:
+    started = time.perf_counter()
+    from ..main import app
+
+    imported = time.perf_counter()
+    from ..database import engine
+    from .asgi import Client, running
+
+    async with running(app):
+        ready = time.perf_counter()
+        _seed(engine)
+        client = Client(app)
+        await client.login(
+            os.environ.get("ADMIN_EMAIL", "admin@rose.local"),
+            os.environ.get("ADMIN_PASSWORD", "changeme"),
+        )
+        first, second = {}, {}
+        for timings in (first, second):
+            for path in PAGES:
+                start = time.perf_counter()
+                r = await client.get(path)
+                timings[path] = (time.perf_counter() - start) * 1000
+                if r.status >= 400:
+                    raise RuntimeError(f"GET {path} returned HTTP {r.status}")
+    return {
+        "import_ms": (imported - started) * 1000,
+        "lifespan_ms": (ready - imported) * 1000,
+        "first_request_ms": first,
+        "second_request_ms": second,
+    }
+
+
+def _median(runs: list[dict]) -> dict:
+    def med(values):
+        return round(statistics.median(values), 2)
+
+    first = [sum(r["first_request_ms"].values()) for r in runs]
+    return {
+        "import_ms": med([r["import_ms"] for r in runs]),
+        "lifespan_ms": med([r["lifespan_ms"] for r in runs]),
+        "first_requests_total_ms": med(first),
+        "first_request_max_ms": med(
+            [max(r["first_request_ms"].values()) for r in runs]
+        ),
+        "second_requests_total_ms": med(
+            [sum(r["second_request_ms"].values()) for r in runs]
+        ),
+        "first_request_ms": {
+            path: med([r["first_request_ms"][path] for r in runs]) for path in PAGES
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(_worker())))
+        return
+
+    setups = {
+        "lazy": {"TEMPLATE_PRECOMPILE": "0"},
+        "cold_cache": {"TEMPLATE_PRECOMPILE": "1"},
+        "warm_cache": {"TEMPLATE_PRECOMPILE": "1"},
+    }
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        for name, overrides in setups.items():
+            runs = []
+            for i in range(args.runs):
+                cache_dir = os.path.join(tmp, f"jinja-{name}")
+                if name != "warm_cache":
+                    # A fresh, empty bytecode cache for every run.
+                    cache_dir += f"-{i}"
+                env = dict(
+                    os.environ,
+                    DB_PATH=db_path,
+                    SECRET_KEY="bench",
+                    TEMPLATE_CACHE_DIR=cache_dir,
+                    RECOMMENDATIONS_INTERVAL="0",
+                    **overrides,
+                )
+                if name == "warm_cache" and i == 0:
+                    # Populate the cache; only the restarts that follow count.
+                    subprocess.run(
+                        [sys.executable, "-m", "rose.bench.startup", "--worker"],
+                        env=env,
+                        check=True,
+                        stdout=subprocess.DEVNULL,
+                    )
+                out = subprocess.run(
+                    [sys.executable, "-m", "rose.bench.startup", "--worker"],
+                    env=env,
+                    check=True,
+                    stdout=subprocess.PIPE,
+                    text=True,
+                )
+                runs.append(json.loads(out.stdout.splitlines()[-1]))
+            results[name] = _median(runs)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
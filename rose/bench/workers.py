@@ -0,0 +1,244 @@
+"""Measure how throughput scales with the number of uvicorn worker processes.
+
+    uv run python -m rose.bench.workers --workers 1 2 4 --clients 64 --duration 20
+
+Seeds a throwaway database with rose.bench.seed (or copies --db), then for
+each worker count starts `uvicorn --workers N` on it and drives it over real
+sockets: every client signs in as its own reader and requests book pages
+and API reads, popular books more often, posting a feedback for a --writes
+share of its requests. Each worker count starts from the same copy of the
+data. Prints throughput, p50/p99 latency and the speed-up over the first
+worker count as JSON. Worker processes are pinned to nothing, so the
+speed-up is bounded by the cores the machine has.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+from . import seed
+
+
+class Response:
+    def __init__(self, status: int, headers: dict[str, str], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection carrying the reader's session."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.cookie = ""
+        self._reader = self._writer = None
+
+    async def request(
+        self, method: str, path: str, body: bytes = b"", content_type: str = ""
+    ) -> Response:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(
+                "127.0.0.1", self.port
+            )
+        lines = [f"{method} {path} HTTP/1.1", "Host: 127.0.0.1"]
+        if self.cookie:
+            lines.append(f"Cookie: {self.cookie}")
+        if content_type:
+            lines.append(f"Content-Type: {content_type}")
+        lines.append(f"Content-Length: {len(body)}")
+        self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        status_line = await self._reader.readline()
+        headers = {}
+        while (line := await self._reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        payload = await self._reader.readexactly(int(headers.get("content-length", 0)))
+        if "set-cookie" in headers:
+            self.cookie = headers["set-cookie"].split(";", 1)[0]
+        if headers.get("connection") == "close":
+            self.close()
+        return Response(int(status_line.split()[1]), headers, payload)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    return round(samples[min(len(samples) - 1, int(len(samples) * pct))], 3)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_ready(port: int, server: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"uvicorn exited with status {server.returncode}")
+        conn = Connection(port)
+        try:
+            if (await conn.request("GET", "/login")).status == 200:
+                return
+        except OSError:
+            await asyncio.sleep(0.2)
+        finally:
+            conn.close()
+    raise SystemExit("uvicorn did not start in time")
+
+
+async def _drive(port: int, seeded: dict, args) -> dict:
+    first_user, last_user = seeded["users"]
+    first_book, last_book = seeded["books"]
+    books = range(first_book, last_book + 1)
+    weights = seed.popularity(len(books))
+    latencies: list[float] = []
+    errors = 0
+    counting = False
+
+    async def client(i: int, stop: float) -> None:
+        nonlocal errors
+        rng = random.Random(i)
+        user_id = first_user + i % (last_user - first_user + 1)
+        conn = Connection(port)
+        form = urlencode(
+            {"email": f"reader{user_id}@rose.local", "password": seed.PASSWORD}
+        )
+        await conn.request(
+            "POST", "/login", form.encode(), "application/x-www-form-urlencoded"
+        )
+        while time.perf_counter() < stop:
+            book_id = rng.choices(books, cum_weights=weights)[0]
+            start = time.perf_counter()
+            try:
+                if rng.random() < args.writes:
+                    body = json.dumps(
+                        {
+                            "user_id": user_id,
+                            "book_id": book_id,
+                            "rating": rng.randint(0, 10),
+                            "review": "Better the second time.",
+                        }
+                    )
+                    r = await conn.request(
+                        "POST", "/api/feedbacks/", body.encode(), "application/json"
+                    )
+                elif rng.random() < 0.5:
+                    r = await conn.request("GET", f"/books/{book_id}")
+                else:
+                    r = await conn.request("GET", f"/api/books/{book_id}")
+                ok = r.status < 400
+            except (OSError, asyncio.IncompleteReadError):
+                conn.close()
+                ok = False
+            if counting:
+                latencies.append((time.perf_counter() - start) * 1000)
+                errors += not ok
+        conn.close()
+
+    stop = time.perf_counter() + args.warmup + args.duration
+    tasks = [asyncio.create_task(client(i, stop)) for i in range(args.clients)]
+    await asyncio.sleep(args.warmup)
+    counting = True
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": _percentile(latencies, 0.50),
+        "p99_ms": _percentile(latencies, 0.99),
+    }
+
+
+def _run(workers: int, db: str, seeded: dict, args) -> dict:
+    port = _free_port()
+    env = dict(os.environ, DB_PATH=db, RECOMMENDATIONS_INTERVAL="0")
+    # Let the app keep its key in the database, as a multi-worker deployment
+    # without SECRET_KEY would.
+    env.pop("SECRET_KEY", None)
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "rose.main:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+            "--no-access-log",
+        ],
+        env=env,
+    )
+    try:
+        asyncio.run(_wait_ready(port, server, timeout=60))
+        return {"workers": workers, **asyncio.run(_drive(port, seeded, args))}
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--db", help="copy this seeded database instead")
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--books", type=int, default=5_000)
+    parser.add_argument("--feedbacks", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=64)
+    parser.add_argument("--writes", type=float, default=0.05, help="share 0-1")
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--duration", type=float, default=20.0)
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine
+
+    from ..models import create_tables
+    from .scenarios import _existing
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.db")
+        engine = create_engine(f"sqlite:///{args.db or source}")
+        if args.db:
+            seeded = _existing(engine)
+        else:
+            create_tables(engine)
+            seeded = seed.seed(engine, args.users, args.books, args.feedbacks)
+        engine.dispose()
+        results = []
+        for workers in args.workers:
+            db = os.path.join(tmp, f"workers{workers}.db")
+            shutil.copyfile(args.db or source, db)
+            results.append(_run(workers, db, seeded, args))
+    base = results[0]["rps"]
+    for result in results:
+        result["speedup"] = round(result["rps"] / base, 2) if base else None
+    print(
+        json.dumps(
+            {"cores": os.cpu_count(), "clients": args.clients, "runs": results},
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Compare sustained feedback-insert throughput with and without group commit.
+
+    uv run python -m rose.bench.writes --concurrency 1 16 64 256
+
+Each mode runs in its own subprocess against its own freshly seeded
+database: `per_request` commits every write on its own (WRITE_QUEUE=0),
+`group_commit` sends writes through the single batching writer. At each
+concurrency level a signed-in reader posts --requests feedbacks as fast as
+they are accepted. Prints throughput, latency percentiles and failed
+requests (such as "database is locked" errors) per level as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import seed
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    return round(samples[min(len(samples) - 1, int(len(samples) * pct))], 3)
+
+
+async def _level(client, user_id: int, books: range, concurrency: int, requests: int):
+    rng = random.Random(concurrency)
+    latencies: list[float] = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with sem:
+            start = time.perf_counter()
+            try:
+                r = await client.post(
+                    "/api/feedbacks/",
+                    json_body={
+                        "user_id": user_id,
+                        "book_id": rng.choice(books),
+                        "rating": rng.randint(0, 10),
+                        "review": "Read it in one sitting.",
+                    },
+                )
+                ok = r.status == 201
+            except Exception:
+                # The in-process client sees the server error itself.
+                ok = False
+            latencies.append((time.perf_counter() - start) * 1000)
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": _percentile(latencies, 0.50),
+        "p99_ms": _percentile(latencies, 0.99),
+    }
+
+
+async def _worker(args) -> list[dict]:
+    from ..database import engine
+    from ..main import app
+    from ..models import create_tables
+    from .asgi import Client, running
+
+    create_tables(engine)
+    ids = seed.seed(engine, args.users, args.books, args.feedbacks)
+    first_book, last_book = ids["books"]
+    user_id = ids["users"][0]
+    async with running(app):
+        client = Client(app)
+        await client.login(f"reader{user_id}@rose.local", seed.PASSWORD)
+        books = range(first_book, last_book + 1)
+        return [
+            await _level(client, user_id, books, c, args.requests)
+            for c in args.concurrency
+        ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--feedbacks", type=int, default=20000)
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(asyncio.run(_worker(args))))
+        return
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode, queue in (("per_request", "0"), ("group_commit", "1")):
+            env = dict(
+                os.environ,
+                DB_PATH=os.path.join(tmp, f"{mode}.db"),
+                WRITE_QUEUE=queue,
+                SECRET_KEY="bench",
+                RECOMMENDATIONS_INTERVAL="0",
+            )
+            out = subprocess.run(
+                [sys.executable, "-m", "rose.bench.writes", "--worker"] + sys.argv[1:],
+                env=env,
+                check=True,
+                stdout=subprocess.PIPE,
+                text=True,
+            )
+            results[mode] = json.loads(out.stdout.splitlines()[-1])
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
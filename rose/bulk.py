@@ -0,0 +1,261 @@
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, NamedTuple
+
+from pydantic import ValidationError
+from sqlalchemy import Select, insert, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .database import DB_ASYNC, AsyncSessionLocal, SessionLocal
+from .models import Book, Feedback, User
+from .schemas import BookCreate, FeedbackCreate
+
+# Rows validated and inserted per write-queue unit. Each batch commits on its
+# own, so a large import never holds the write lock for long and a bad row
+# only costs its own line.
+IMPORT_BATCH = 1000
+EXPORT_BATCH = 1000
+# Only the first errors are reported back in full; the rest are counted.
+MAX_ERRORS = 100
+
+# ── Reading uploads ───────────────────────────────────────────────────────────
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, str]]:
+    """Split a streamed UTF-8 body into numbered lines without reading it all."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer, lineno = "", 0
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *complete, buffer = buffer.split("\n")
+        for line in complete:
+            lineno += 1
+            yield lineno, line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield lineno + 1, buffer.rstrip("\r")
+
+
+async def read_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, Any]]:
+    async for lineno, line in _lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            yield lineno, json.loads(line)
+        except ValueError:
+            yield lineno, None
+
+
+async def read_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[tuple[int, Any]]:
+    """CSV with a header row. Empty cells are read as missing values."""
+    header, record, start = None, [], 0
+    async for lineno, line in _lines(chunks):
+        if not record:
+            start = lineno
+        record.append(line)
+        # A quoted field may span lines; the record is complete once its
+        # quotes balance (an escaped quote is written as two).
+        if sum(part.count('"') for part in record) % 2:
+            continue
+        values = next(csv.reader(["\n".join(record)]), [])
+        record = []
+        if not any(values):
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        yield start, {k: v for k, v in zip(header, values) if v != ""}
+
+
+# ── Importing ─────────────────────────────────────────────────────────────────
+
+
+class RowError(NamedTuple):
+    line: int
+    error: str
+
+
+class BatchResult(NamedTuple):
+    created: int
+    duplicates: int
+    errors: list[RowError]
+    books_created: int
+
+
+def _describe(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" if e["loc"] else e["msg"]
+        for e in exc.errors()
+    )
+
+
+def _existing_books(db: Session, keys: set[tuple[str, str]]) -> dict:
+    """Map (title, author) to the id of a book already stored under it."""
+    if not keys:
+        return {}
+    rows = db.execute(
+        select(Book.id, Book.title, Book.author).where(
+            Book.title.in_({title for title, _ in keys})
+        )
+    )
+    return {(r.title, r.author): r.id for r in rows if (r.title, r.author) in keys}
+
+
+def _insert_books(db: Session, books: dict[tuple[str, str], BookCreate]) -> dict:
+    if not books:
+        return {}
+    rows = db.execute(
+        insert(Book).returning(Book.id, Book.title, Book.author),
+        [b.model_dump() for b in books.values()],
+    )
+    return {(r.title, r.author): r.id for r in rows}
+
+
+def _objects(rows: list[tuple[int, Any]], errors: list[RowError]):
+    for lineno, data in rows:
+        if isinstance(data, dict):
+            yield lineno, data
+        else:
+            errors.append(RowError(lineno, "Expected a JSON object"))
+
+
+def import_books(db: Session, rows: list[tuple[int, Any]], user_id: int) -> BatchResult:
+    errors: list[RowError] = []
+    books: dict[tuple[str, str], BookCreate] = {}
+    duplicates = 0
+    for lineno, data in _objects(rows, errors):
+        try:
+            book = BookCreate.model_validate(data)
+        except ValidationError as exc:
+            errors.append(RowError(lineno, _describe(exc)))
+            continue
+        key = (book.title, book.author)
+        if key in books:
+            duplicates += 1
+        else:
+            books[key] = book
+    existing = _existing_books(db, set(books))
+    duplicates += len(existing)
+    created = _insert_books(db, {k: b for k, b in books.items() if k not in existing})
+    return BatchResult(len(created), duplicates, sorted(errors), len(created))
+
+
+def import_feedbacks(
+    db: Session, rows: list[tuple[int, Any]], user_id: int
+) -> BatchResult:
+    """Feedback rows name their book either by `book_id` or by `title` and
+    `author` (plus optional book fields), in which case the book is matched
+    against existing ones or created. `user_id` defaults to the importer."""
+    errors: list[RowError] = []
+    valid: list[tuple[int, FeedbackCreate, BookCreate | None]] = []
+    for lineno, data in _objects(rows, errors):
+        data = {"user_id": user_id, **data}
+        book = None
+        try:
+            if data.get("book_id") is None:
+                book = BookCreate.model_validate(data)
+                data["book_id"] = 0  # resolved below
+            feedback = FeedbackCreate.model_validate(data)
+        except ValidationError as exc:
+            errors.append(RowError(lineno, _describe(exc)))
+            continue
+        valid.append((lineno, feedback, book))
+
+    user_ids = {f.user_id for _, f, _ in valid}
+    known_users = set(db.scalars(select(User.id).where(User.id.in_(user_ids))))
+    book_ids = {f.book_id for _, f, book in valid if book is None}
+    known_books = set(db.scalars(select(Book.id).where(Book.id.in_(book_ids))))
+    accepted = []
+    for lineno, feedback, book in valid:
+        if feedback.user_id not in known_users:
+            errors.append(RowError(lineno, "User not found"))
+        elif book is None and feedback.book_id not in known_books:
+            errors.append(RowError(lineno, "Book not found"))
+        else:
+            accepted.append((feedback, book))
+
+    books = {(b.title, b.author): b for _, b in accepted if b is not None}
+    by_key = _existing_books(db, set(books))
+    created_books = _insert_books(
+        db, {k: b for k, b in books.items() if k not in by_key}
+    )
+    by_key |= created_books
+    for feedback, book in accepted:
+        if book is not None:
+            feedback.book_id = by_key[(book.title, book.author)]
+    if accepted:
+        db.execute(insert(Feedback), [f.model_dump() for f, _ in accepted])
+    return BatchResult(len(accepted), 0, sorted(errors), len(created_books))
+
+
+# ── Exporting ─────────────────────────────────────────────────────────────────
+# Exports read the table through a server-side cursor in partitions of
+# EXPORT_BATCH rows, on a session of their own that lives as long as the
+# response body, so memory use does not grow with the table.
+
+_EXPORT_COLUMNS = {
+    "books": [c for c in Book.__table__.columns],
+    "feedbacks": [c for c in Feedback.__table__.columns],
+    "users": [c for c in User.__table__.columns if c.name != "password"],
+}
+
+
+def export_columns(table: str) -> list[str]:
+    return [c.name for c in _EXPORT_COLUMNS[table]]
+
+
+def _export_query(table: str) -> Select:
+    columns = _EXPORT_COLUMNS[table]
+    return (
+        select(*columns)
+        .order_by(columns[0].table.c.id)
+        .execution_options(yield_per=EXPORT_BATCH)
+    )
+
+
+async def _partitions(table: str) -> AsyncIterator[list]:
+    stmt = _export_query(table)
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(stmt)
+            async for partition in result.partitions():
+                yield partition
+        return
+    db = SessionLocal()
+    try:
+        partitions = (await run_in_threadpool(db.execute, stmt)).partitions()
+        while partition := await run_in_threadpool(next, partitions, None):
+            yield partition
+    finally:
+        await run_in_threadpool(db.close)
+
+
+def _plain(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+async def export_ndjson(table: str) -> AsyncIterator[str]:
+    names = export_columns(table)
+    async for partition in _partitions(table):
+        yield "".join(
+            json.dumps(dict(zip(names, map(_plain, row))), ensure_ascii=False) + "\n"
+            for row in partition
+        )
+
+
+async def export_csv(table: str) -> AsyncIterator[str]:
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(export_columns(table))
+    async for partition in _partitions(table):
+        writer.writerows(
+            ["" if v is None else _plain(v) for v in row] for row in partition
+        )
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    yield out.getvalue()
@@ -0,0 +1,288 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+# ── Bounded TTL/LRU cache ─────────────────────────────────────────────────────
+
+_MISSING = object()
+
+# Every cache registers itself here so its counters can be reported.
+_registry: dict[str, "TTLCache"] = {}
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    Holds at most `maxsize` entries; inserting past that evicts the least
+    recently used one. Hit, miss, eviction and expiry counts are kept for
+    monitoring.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        _registry[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def cache_stats() -> dict[str, dict[str, Any]]:
+    """Counters for every cache in the process, keyed by cache name."""
+    return {name: cache.stats() for name, cache in _registry.items()}
+
+
+# ── Write versions ────────────────────────────────────────────────────────────
+# A counter per table. Cached entries remember the counters they were built
+# from and are discarded once any of them has moved on.
+#
+# The counters live in the table_versions table, where triggers advance them
+# in the same transaction as every insert, update and delete, so each worker
+# process sees writes made by the others (and by scripts). Each process keeps
+# a copy: bump() re-reads the tables a handler has just written, so its own
+# next request sees the write, and poll() picks up everyone else's writes,
+# re-reading only once PRAGMA data_version reports a commit by some other
+# connection. Until create_version_triggers() has run (tools that never start
+# the app), bump() just counts in memory.
+
+# Tables whose writes advance their counter by trigger. Other counters (such
+# as "recommendations") are advanced by their writer with advance().
+VERSIONED_TABLES = ("books", "feedbacks", "users")
+
+_versions: dict[str, int] = {}
+_modified: dict[str, float] = {}
+_versions_lock = threading.Lock()
+_started = time.time()
+_listeners: dict[str, list[Callable[[], None]]] = {}
+_conn: sqlite3.Connection | None = None
+_data_version: int | None = None
+
+# Unix time with sub-second precision; SQLite's unixepoch('subsec') needs 3.42.
+_NOW = "(julianday('now') - 2440587.5) * 86400.0"
+
+
+def create_version_triggers(engine, counters: tuple[str, ...] = ()) -> None:
+    """Create table_versions and its triggers, plus a row for each of
+    `counters` (advanced with advance()), then start reading from it."""
+    global _conn
+    with engine.connect() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE IF NOT EXISTS table_versions (name VARCHAR(64) PRIMARY "
+            "KEY, version INTEGER NOT NULL DEFAULT 0, modified FLOAT NOT NULL)"
+        )
+        for name in VERSIONED_TABLES + counters:
+            conn.exec_driver_sql(
+                "INSERT OR IGNORE INTO table_versions (name, modified) "
+                f"VALUES (?, {_NOW})",
+                (name,),
+            )
+        for table in VERSIONED_TABLES:
+            for op in ("INSERT", "UPDATE", "DELETE"):
+                conn.exec_driver_sql(
+                    f"CREATE TRIGGER IF NOT EXISTS {table}_version_{op.lower()} "
+                    f"AFTER {op} ON {table} BEGIN UPDATE table_versions SET "
+                    f"version = version + 1, modified = {_NOW} "
+                    f"WHERE name = '{table}'; END"
+                )
+        conn.commit()
+    # Its own connection: data_version only counts commits made by others,
+    # and reading the counters must never wait for a pooled connection.
+    _conn = sqlite3.connect(
+        engine.url.database, check_same_thread=False, isolation_level=None
+    )
+    poll()
+
+
+def advance(conn, *tables: str) -> None:
+    """Advance the counters of tables that have no triggers, inside the
+    transaction on `conn` that wrote them."""
+    for table in tables:
+        conn.exec_driver_sql(
+            "INSERT INTO table_versions (name, version, modified) "
+            f"VALUES (?, 1, {_NOW}) ON CONFLICT (name) DO UPDATE SET "
+            f"version = version + 1, modified = excluded.modified",
+            (table,),
+        )
+
+
+def on_write(table: str, callback: Callable[[], None]) -> None:
+    """Call `callback` whenever this process sees `table`'s counter move,
+    whichever process wrote it."""
+    _listeners.setdefault(table, []).append(callback)
+
+
+def _refresh(tables: tuple[str, ...] | None) -> None:
+    sql = "SELECT name, version, modified FROM table_versions"
+    if tables is not None:
+        sql += f" WHERE name IN ({', '.join('?' * len(tables))})"
+    changed = []
+    with _versions_lock:
+        for name, version, modified in _conn.execute(sql, tables or ()):
+            if _versions.get(name) != version:
+                _versions[name] = version
+                _modified[name] = modified
+                changed.append(name)
+    for name in changed:
+        for callback in _listeners.get(name, ()):
+            callback()
+
+
+def bump(*tables: str) -> None:
+    """Called after a write to `tables` has committed."""
+    if _conn is not None:
+        _refresh(tables)
+        return
+    now = time.time()
+    with _versions_lock:
+        for table in tables:
+            _versions[table] = _versions.get(table, 0) + 1
+            _modified[table] = now
+    for table in tables:
+        for callback in _listeners.get(table, ()):
+            callback()
+
+
+def poll() -> None:
+    """Pick up writes committed since the last poll, by any process."""
+    global _data_version
+    if _conn is None:
+        return
+    with _versions_lock:
+        data_version = _conn.execute("PRAGMA data_version").fetchone()[0]
+    if data_version != _data_version:
+        _data_version = data_version
+        _refresh(None)
+
+
+def stamp(tables: tuple[str, ...]) -> tuple[int, ...]:
+    with _versions_lock:
+        return tuple(_versions.get(table, 0) for table in tables)
+
+
+def last_modified(tables: tuple[str, ...]) -> float:
+    """Unix time of the latest write to any of `tables` seen by this process
+    (process start for tables it knows no write to)."""
+    with _versions_lock:
+        return max(_modified.get(t, _started) for t in tables)
+
+
+# ── Rendered page cache ───────────────────────────────────────────────────────
+
+
+class PageCache:
+    """LRU cache of rendered response bodies, capped by total size in bytes.
+
+    Each entry records the tables it depends on and their write versions at
+    render time; a lookup after any of those tables has been written is a
+    miss. Take the stamp *before* querying, so a write that lands while the
+    page renders leaves the entry already stale.
+    """
+
+    def __init__(self, name: str, maxbytes: int):
+        self.name = name
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self._data: OrderedDict[Hashable, tuple[tuple, tuple, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+        _registry[name] = self
+
+    def get(self, key: Hashable) -> bytes | None:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            tables, version, body = entry
+            if stamp(tables) != version:
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def set(
+        self, key: Hashable, tables: tuple[str, ...], version: tuple, body: bytes
+    ) -> None:
+        if len(body) > self.maxbytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (tables, version, body)
+            self.nbytes += len(body)
+            while self.nbytes > self.maxbytes:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def _drop(self, key: Hashable) -> None:
+        self.nbytes -= len(self._data.pop(key)[2])
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "bytes": self.nbytes,
+                "maxbytes": self.maxbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,151 @@
+"""Response compression for HTML, JSON and other text bodies.
+
+Brotli is used when the `brotli` package is installed and the client accepts
+it, gzip otherwise. Responses that already carry a Content-Encoding (such as
+precompressed static assets) pass through untouched.
+"""
+
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+# Bodies smaller than this go out as they are: the framing costs more than
+# compression saves.
+MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 500))
+# Fast settings: dynamic pages are compressed on every request.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE = frozenset(
+    {
+        "text/html",
+        "text/css",
+        "text/plain",
+        "text/csv",
+        "text/javascript",
+        "application/javascript",
+        "application/json",
+        "application/x-ndjson",
+        "application/xml",
+        "image/svg+xml",
+    }
+)
+
+
+def accepted_encodings(accept_encoding: str) -> list[str]:
+    """The codings this server can produce that `accept_encoding` allows,
+    preferred first."""
+    allowed = {}
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        allowed[coding.strip()] = q
+    available = ["br", "gzip"] if brotli is not None else ["gzip"]
+    wildcard = allowed.get("*", 0.0)
+    return [c for c in available if allowed.get(c, wildcard) > 0]
+
+
+class _Encoder:
+    def __init__(self, coding: str):
+        self.coding = coding
+        if coding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._gzip = zlib.compressobj(
+                GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+            )
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        """Compress a chunk, flushing so that what was sent so far can be
+        decoded (streamed exports reach the client as they are produced)."""
+        if self.coding == "br":
+            out = self._brotli.process(data)
+            return out + (self._brotli.finish() if final else self._brotli.flush())
+        out = self._gzip.compress(data)
+        return out + self._gzip.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+class CompressionMiddleware:
+    """Compress text responses of at least `minimum_size` bytes.
+
+    The decision is made on the first body chunk: a complete body under the
+    threshold is sent as is, anything larger (or streamed) is compressed
+    chunk by chunk. Compressed responses get a weak ETag, since their bytes
+    differ from the identity encoding.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codings = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        start: Message | None = None
+        encoder: _Encoder | None = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").partition(";")[0]
+                if (
+                    "content-encoding" in headers
+                    or message["status"] == 206
+                    or media_type.strip().lower() not in COMPRESSIBLE
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    if "accept-encoding" not in headers.get("vary", "").lower():
+                        MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+                    start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                if start is not None:
+                    await send(start)
+                    start = None
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(scope=start)
+                if (not more_body and len(body) < self.minimum_size) or not codings:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = _Encoder(codings[0])
+                headers["Content-Encoding"] = encoder.coding
+                del headers["Content-Length"]
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    headers["ETag"] = f"W/{etag}"
+                body = encoder.compress(body, final=not more_body)
+                if not more_body:
+                    headers["Content-Length"] = str(len(body))
+                await send(start)
+                start = None
+            else:
+                body = encoder.compress(body, final=not more_body)
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,79 @@
+import hashlib
+import math
+import secrets
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import HTTPException, Request, Response
+
+from .cache import last_modified, stamp
+from .database import engine
+from .workers import shared_setting
+
+
+def _epoch() -> str:
+    """Write versions are kept in the database and only ever go up, but a
+    new database starts them from zero again, so every ETag carries an epoch
+    stored with the database. Every worker process issues the same tags.
+    Looked up on first use, not at import, and cached by shared_setting."""
+    return shared_setting(engine, "etag_epoch", lambda: secrets.token_hex(4))
+
+
+# ── Conditional GET ───────────────────────────────────────────────────────────
+
+
+def _etag(request: Request, version: tuple[int, ...]) -> str:
+    target = request.url.path + "?" + str(request.query_params)
+    variant = hashlib.blake2s(target.encode(), digest_size=6).hexdigest()
+    return f'"{_epoch()}-{"-".join(map(str, version))}-{variant}"'
+
+
+def _matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    return any(
+        tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(",")
+    )
+
+
+def _not_modified_since(if_modified_since: str, modified: int) -> bool:
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return modified <= since
+
+
+def conditional(*tables: str):
+    """Build a dependency that answers conditional GETs for a route whose
+    response depends only on `tables` and the request URL.
+
+    Sets ETag and Last-Modified on the response. When If-None-Match (or,
+    without it, If-Modified-Since) shows the client's copy is current, it
+    raises a 304 before the route queries or serializes anything. List it
+    after the auth dependencies so access is checked first.
+    """
+
+    async def dependency(request: Request, response: Response) -> None:
+        etag = _etag(request, stamp(tables))
+        # HTTP dates have one-second resolution: round the last write up to
+        # the next whole second, and only send that date once the second is
+        # over. A write made later is then always dated later, whereas one
+        # in the same second as the fetch would otherwise earn a false 304.
+        modified = math.ceil(last_modified(tables))
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if modified <= time.time():
+            headers["Last-Modified"] = formatdate(modified, usegmt=True)
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_none_match is not None:
+            fresh = _matches(if_none_match, etag)
+        else:
+            fresh = if_modified_since is not None and _not_modified_since(
+                if_modified_since, modified
+            )
+        if fresh:
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
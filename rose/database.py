@@ -1,26 +1,187 @@
 import os
+from typing import Any, Callable, TypeVar
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
+
+from . import metrics
 
 DB_PATH = os.environ.get("DB_PATH", "rose.db")
 DATABASE_URL = f"sqlite:///{DB_PATH}"
 
+# Opt-in async mode: requests talk to SQLite through aiosqlite instead of
+# borrowing a worker thread from Starlette's threadpool for every query.
+DB_ASYNC = os.environ.get("DB_ASYNC", "").lower() in ("1", "true", "yes")
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+# ── Connection profile ────────────────────────────────────────────────────────
+# Applied to every new connection. WAL lets readers proceed while a feedback
+# write is in progress; busy_timeout makes writers wait for the lock instead
+# of failing with "database is locked". Each value can be overridden with the
+# matching DB_* environment variable.
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.environ.get("DB_JOURNAL_MODE", "WAL"),
+    "synchronous": os.environ.get("DB_SYNCHRONOUS", "NORMAL"),
+    "cache_size": _env_int("DB_CACHE_SIZE", -64000),  # negative = KiB
+    "mmap_size": _env_int("DB_MMAP_SIZE", 256 * 1024 * 1024),
+    "temp_store": os.environ.get("DB_TEMP_STORE", "MEMORY"),
+    "busy_timeout": _env_int("DB_BUSY_TIMEOUT", 5000),  # ms
+}
+
+POOL_SIZE = _env_int("DB_POOL_SIZE", 5)
+MAX_OVERFLOW = _env_int("DB_MAX_OVERFLOW", 10)
+POOL_TIMEOUT = _env_int("DB_POOL_TIMEOUT", 30)  # seconds
+
+# How often the app runs PRAGMA optimize to refresh planner statistics, in
+# seconds. 0 disables it.
+OPTIMIZE_INTERVAL = _env_int("DB_OPTIMIZE_INTERVAL", 3600)
+
+for _name, _value in SQLITE_PRAGMAS.items():
+    if not str(_value).lstrip("-").isalnum():
+        raise ValueError(f"Invalid value for PRAGMA {_name}: {_value!r}")
+
+
+def _apply_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    # Not tunable: feedbacks rely on ON DELETE CASCADE to follow their book or
+    # user, which SQLite only honours with foreign keys switched on.
+    cursor.execute("PRAGMA foreign_keys = ON")
+    # Let SQLite gather statistics for the tables this connection touches.
+    cursor.execute("PRAGMA optimize = 0x10002")
+    cursor.close()
+    # Transactions are begun by _begin() instead of by pysqlite, which only
+    # emits BEGIN before INSERT/UPDATE/DELETE: a SAVEPOINT opened first would
+    # otherwise start a transaction of its own and commit on release.
+    dbapi_connection.isolation_level = None
+
+
+def _begin(conn) -> None:
+    """Begin each transaction explicitly (SQLAlchemy's pysqlite recipe).
+
+    Connections with the sqlite_begin="IMMEDIATE" execution option (the
+    write queue's) take the write lock up front, waiting busy_timeout for
+    it, rather than failing when a read inside the transaction is later
+    upgraded to a write. Sent on the DBAPI cursor so it is not counted as
+    one of the request's statements.
+    """
+    mode = conn.get_execution_options().get("sqlite_begin", "DEFERRED")
+    conn.connection.cursor().execute(f"BEGIN {mode}")
+
+
+def optimize(engine) -> None:
+    """Run PRAGMA optimize so the query planner works from fresh statistics."""
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA optimize")
+
+
+# The sync engine is always available: startup migrations, seeding and
+# benchmarks use it directly.
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False},
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_timeout=POOL_TIMEOUT,
+)
+event.listen(engine, "connect", _apply_pragmas)
+event.listen(engine, "begin", _begin)
+event.listen(engine, "before_cursor_execute", metrics.before_cursor_execute)
+event.listen(engine, "after_cursor_execute", metrics.after_cursor_execute)
+
+# Objects are handed back to handlers after their unit of work commits (see
+# run()), where they are read by templates and response models, so commits do
+# not expire them.
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=engine
+)
+
+async_engine = None
+if DB_ASYNC:
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{DB_PATH}",
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=POOL_TIMEOUT,
+    )
+    for _name, _listener in (
+        ("connect", _apply_pragmas),
+        ("begin", _begin),
+        ("before_cursor_execute", metrics.before_cursor_execute),
+        ("after_cursor_execute", metrics.after_cursor_execute),
+    ):
+        event.listen(async_engine.sync_engine, _name, _listener)
+
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    if DB_ASYNC
+    else None
+)
+
+# Sessions for rose.writes: their transactions begin with BEGIN IMMEDIATE.
+WriteSessionLocal = sessionmaker(
+    autoflush=False,
+    expire_on_commit=False,
+    bind=engine.execution_options(sqlite_begin="IMMEDIATE"),
+)
+AsyncWriteSessionLocal = (
+    async_sessionmaker(
+        async_engine.execution_options(sqlite_begin="IMMEDIATE"),
+        autoflush=False,
+        expire_on_commit=False,
+    )
+    if DB_ASYNC
+    else None
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DbSession = Session | AsyncSession
+T = TypeVar("T")
 
 
 class Base(DeclarativeBase):
     pass
 
 
-def get_db():
+async def get_db():
+    if DB_ASYNC:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        await run_in_threadpool(db.close)
+
+
+def _unit(db: Session, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    try:
+        result = fn(db, *args, **kwargs)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return result
+
+
+async def run(db: DbSession, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Call fn(session, *args, **kwargs) without blocking the event loop.
+
+    Database work is written once against a plain Session. In async mode it
+    runs on the AsyncSession's connection via run_sync; otherwise it is sent
+    to the threadpool. Each call is its own transaction, so the connection
+    goes back to the pool between calls instead of being held while the
+    request waits for a thread. Anything the caller reads afterwards
+    (templates, response models) must already be loaded when fn returns.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(_unit, fn, *args, **kwargs)
+    return await run_in_threadpool(_unit, db, fn, *args, **kwargs)
@@ -0,0 +1,226 @@
+"""In-process change bus behind the /events Server-Sent Events stream.
+
+Write handlers publish each change as rendered htmx fragments (elements
+carrying hx-swap-oob), one for pages showing a single book, one for pages
+showing a single user and one for the listings. Every open page holds a
+subscription and applies whatever it is sent, so it stays current without
+reloading or polling.
+"""
+
+import asyncio
+import os
+from collections.abc import AsyncIterator
+
+from fastapi import Request
+
+from .templating import env
+
+# Events buffered per subscriber before it is considered too slow to keep.
+QUEUE_SIZE = int(os.environ.get("EVENTS_QUEUE_SIZE", 64))
+# Seconds between keep-alive comments on an idle stream; they also let the
+# server notice clients that went away without closing the connection.
+KEEPALIVE = float(os.environ.get("EVENTS_KEEPALIVE", 15))
+
+# Header an htmx page sends with its writes, naming its own subscription:
+# the page already swapped in the response, so the echo is not sent back.
+CLIENT_HEADER = "X-Rose-Client"
+
+
+class Subscriber:
+    __slots__ = ("queue", "book_id", "user_id", "is_admin", "client", "dropped")
+
+    def __init__(
+        self,
+        book_id: int | None,
+        user_id: int | None,
+        is_admin: bool,
+        client: str | None,
+    ):
+        self.queue: asyncio.Queue[str] = asyncio.Queue(QUEUE_SIZE)
+        self.book_id = book_id
+        self.user_id = user_id
+        self.is_admin = is_admin
+        self.client = client
+        self.dropped = False
+
+
+class ChangeBus:
+    """Fans published changes out to subscriber queues.
+
+    Only touched from the event loop, so it needs no locking. Publishing
+    never waits: a subscriber whose queue is full has missed changes it
+    cannot rebuild, so it is dropped and told to resync (reload) instead of
+    buffering without bound or slowing the writer down.
+    """
+
+    def __init__(self):
+        self._subscribers: set[Subscriber] = set()
+        self.published = self.delivered = self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(
+        self,
+        book_id: int | None = None,
+        is_admin: bool = False,
+        client=None,
+        user_id: int | None = None,
+    ) -> Subscriber:
+        subscriber = Subscriber(book_id, user_id, is_admin, client)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+    def publish(
+        self,
+        *,
+        book_id: int | None = None,
+        page: str | None = None,
+        user_id: int | None = None,
+        user_page: str | None = None,
+        listing: str | None = None,
+        admin_only: bool = False,
+        origin: str | None = None,
+    ) -> None:
+        """Send `page` to subscribers following `book_id`, `user_page` to
+        those following `user_id` and `listing` to those following
+        everything."""
+        self.published += 1
+        for subscriber in list(self._subscribers):
+            if subscriber.client is not None and subscriber.client == origin:
+                continue
+            if admin_only and not subscriber.is_admin:
+                continue
+            if subscriber.book_id is not None:
+                data = page if subscriber.book_id == book_id else None
+            elif subscriber.user_id is not None:
+                data = user_page if subscriber.user_id == user_id else None
+            else:
+                data = listing
+            if not data:
+                continue
+            try:
+                subscriber.queue.put_nowait(data)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                subscriber.dropped = True
+                self._subscribers.discard(subscriber)
+                self.dropped += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+bus = ChangeBus()
+
+
+# ── Publishing ────────────────────────────────────────────────────────────────
+# Called by the write handlers once their transaction has committed. Nothing
+# is rendered while no one is subscribed.
+
+
+def _render(name: str, **context) -> str:
+    # Streams are only open to signed-in users, so fragments show the
+    # controls any signed-in user sees.
+    return env.get_template(name).render(current_user=True, **context)
+
+
+def _origin(request: Request) -> str | None:
+    return request.headers.get(CLIENT_HEADER)
+
+
+def book_changed(
+    request: Request, book_id: int, book=None, created: bool = False
+) -> None:
+    """Publish a created or updated `book`, or (without one) a deleted id."""
+    if not bus:
+        return
+    bus.publish(
+        book_id=book_id,
+        page=(
+            _render("partials/book_header.html", book=book, oob=True)
+            if book is not None
+            else None
+        ),
+        listing=_render(
+            "partials/events/book.html", book=book, book_id=book_id, created=created
+        ),
+        origin=_origin(request),
+    )
+
+
+def feedback_changed(
+    request: Request,
+    book,
+    fb=None,
+    feedback_id: int | None = None,
+    user_id: int | None = None,
+    created=False,
+) -> None:
+    """Publish a created or updated feedback `fb`, or a deleted
+    `feedback_id` written by `user_id`, with the counters of its `book`."""
+    if not bus:
+        return
+    if fb is not None:
+        feedback_id, user_id = fb.id, fb.user_id
+    context = {"fb": fb, "feedback_id": feedback_id, "created": created}
+    bus.publish(
+        book_id=book.id,
+        page=_render("partials/events/feedback.html", book=book, **context),
+        user_id=user_id,
+        user_page=_render(
+            "partials/events/feedback_listing.html", user_page=True, **context
+        ),
+        listing=_render("partials/events/feedback_listing.html", **context),
+        origin=_origin(request),
+    )
+
+
+def user_changed(
+    request: Request, user_id: int, user=None, created: bool = False
+) -> None:
+    """Publish a created or updated `user`, or a deleted id, to admins."""
+    if not bus:
+        return
+    bus.publish(
+        listing=_render(
+            "partials/events/user.html", user=user, user_id=user_id, created=created
+        ),
+        admin_only=True,
+        origin=_origin(request),
+    )
+
+
+# ── Stream ────────────────────────────────────────────────────────────────────
+
+
+def _message(data: str, event: str = "message") -> str:
+    lines = "".join(f"data: {line}\n" for line in data.splitlines())
+    return f"event: {event}\n{lines}\n"
+
+
+async def stream(subscriber: Subscriber) -> AsyncIterator[str]:
+    """The SSE body for one subscriber; unsubscribes when the client goes
+    away (the response cancels this generator)."""
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                data = await asyncio.wait_for(subscriber.queue.get(), KEEPALIVE)
+            except TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if subscriber.dropped:
+                yield _message("resync", event="resync")
+                return
+            yield _message(data)
+    finally:
+        bus.unsubscribe(subscriber)
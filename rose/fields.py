@@ -0,0 +1,202 @@
+"""Sparse fieldsets and side-loaded related objects for API reads.
+
+List and detail routes send every field of their response model by default,
+and each feedback embeds its whole user and book. `?fields=` names the
+fields wanted instead (`id` is always sent):
+
+    GET /api/books/?fields=title,rating_avg
+
+On feedbacks, `?include=user,book` sends each distinct user and book once,
+keyed by id, next to the feedbacks themselves:
+
+    {"data": [...], "included": {"users": {"7": {...}}, "books": {...}}}
+
+Dotted names in `fields` narrow the included objects, as in
+`fields=rating,book.title`. Only the columns asked for are selected (plus
+any a listing pages by), and the response is built from them directly
+rather than validated through the response model.
+"""
+
+import json
+from datetime import datetime
+from typing import Any, NamedTuple
+
+from fastapi import HTTPException, Query, Response
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.orm import Session, load_only
+
+from .models import Book, Feedback, User
+from .schemas import BookOut, FeedbackOut, UserOut
+
+
+class Resource(NamedTuple):
+    model: type
+    schema: type[BaseModel]
+    # Relations ?include= accepts, mapped to the resource they point at.
+    relations: dict[str, str]
+
+    @property
+    def fields(self) -> tuple[str, ...]:
+        return tuple(
+            name for name in self.schema.model_fields if name not in self.relations
+        )
+
+
+RESOURCES = {
+    "books": Resource(Book, BookOut, {}),
+    "users": Resource(User, UserOut, {}),
+    "feedbacks": Resource(Feedback, FeedbackOut, {"user": "users", "book": "books"}),
+}
+
+
+class Sparse(NamedTuple):
+    resource: str
+    fields: tuple[str, ...]
+    # Each included relation and the fields sent for it.
+    include: dict[str, tuple[str, ...]]
+
+
+def _names(value: str | None) -> list[str]:
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+def _fieldset(resource: Resource, names: list[str]) -> tuple[str, ...]:
+    for name in names:
+        if name not in resource.fields:
+            raise HTTPException(status_code=400, detail=f"Unknown field: {name}")
+    if not names:
+        return resource.fields
+    return tuple(dict.fromkeys(["id", *names]))
+
+
+def parse(resource_name: str, fields: str | None, include: str | None) -> Sparse | None:
+    """Read ?fields= and ?include=; None when neither was given."""
+    if fields is None and include is None:
+        return None
+    resource = RESOURCES[resource_name]
+    own: list[str] = []
+    nested: dict[str, list[str]] = {}
+    for relation in _names(include):
+        if relation not in resource.relations:
+            raise HTTPException(status_code=400, detail=f"Cannot include: {relation}")
+        nested[relation] = []
+    for name in _names(fields):
+        relation, dot, field = name.partition(".")
+        if not dot:
+            own.append(name)
+        elif relation in nested:
+            nested[relation].append(field)
+        else:
+            raise HTTPException(
+                status_code=400, detail=f"{name} needs include={relation}"
+            )
+    return Sparse(
+        resource_name,
+        _fieldset(resource, own),
+        {
+            relation: _fieldset(RESOURCES[resource.relations[relation]], names)
+            for relation, names in nested.items()
+        },
+    )
+
+
+def sparse_params(resource_name: str):
+    """Build a dependency reading ?fields= (and ?include=, for resources
+    with relations) into a Sparse, or None to send the full response."""
+    if not RESOURCES[resource_name].relations:
+
+        def dependency(
+            fields: str | None = Query(None, description="Comma-separated fields"),
+        ) -> Sparse | None:
+            return parse(resource_name, fields, None)
+
+        return dependency
+
+    def dependency(
+        fields: str | None = Query(
+            None, description="Comma-separated fields; relation.field for included"
+        ),
+        include: str | None = Query(
+            None,
+            description="Related objects to send once each, in `included`: "
+            + ", ".join(RESOURCES[resource_name].relations),
+        ),
+    ) -> Sparse | None:
+        return parse(resource_name, fields, include)
+
+    return dependency
+
+
+# ── Loading ───────────────────────────────────────────────────────────────────
+
+
+def columns(sparse: Sparse, keys: tuple = ()):
+    """A load_only() option selecting the requested fields, the foreign keys
+    of included relations and the sort `keys` a listing pages by."""
+    model = RESOURCES[sparse.resource].model
+    names = [*sparse.fields, *(f"{r}_id" for r in sparse.include)]
+    names += [key.key for key in keys]
+    return load_only(*(getattr(model, name) for name in dict.fromkeys(names)))
+
+
+def included(db: Session, sparse: Sparse, items: list) -> dict[str, dict] | None:
+    """Load each related object referenced by `items` once, with only its
+    requested fields. None when nothing was included."""
+    if not sparse.include:
+        return None
+    relations = RESOURCES[sparse.resource].relations
+    out = {}
+    for relation, fields in sparse.include.items():
+        model = RESOURCES[relations[relation]].model
+        ids = {getattr(item, f"{relation}_id") for item in items}
+        # Plain rows rather than ORM objects: nothing else reads them.
+        rows = (
+            db.execute(
+                select(*(getattr(model, f) for f in fields))
+                .where(model.id.in_(ids))
+                .order_by(model.id)
+            ).all()
+            if ids
+            else []
+        )
+        out[relations[relation]] = {str(row.id): _object(row, fields) for row in rows}
+    return out
+
+
+# ── Rendering ─────────────────────────────────────────────────────────────────
+
+
+def _plain(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _object(row, fields: tuple[str, ...]) -> dict:
+    return {name: _plain(getattr(row, name)) for name in fields}
+
+
+def render(
+    sparse: Sparse, data, response: Response, included: dict[str, dict] | None = None
+) -> Response:
+    """The JSON response for one object or a list of them: bare, or under
+    `data` with `included` beside it when relations were included. Headers
+    already set on the route's `response` (ETag, X-Next-Cursor) are kept.
+    Each included relation's foreign key is sent so objects can be matched
+    with `included`."""
+    fields = tuple(
+        dict.fromkeys([*sparse.fields, *(f"{r}_id" for r in sparse.include)])
+    )
+    if isinstance(data, list):
+        body = [_object(row, fields) for row in data]
+    else:
+        body = _object(data, fields)
+    if included is not None:
+        body = {"data": body, "included": included}
+    out = Response(
+        json.dumps(body, ensure_ascii=False, separators=(",", ":")),
+        media_type="application/json",
+    )
+    for name, value in response.headers.items():
+        if name != "content-length":
+            out.headers[name] = value
+    return out
@@ -1,20 +1,62 @@
+import asyncio
 import logging
 import os
 import secrets
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from sqlalchemy.schema import CreateTable
+from starlette.concurrency import run_in_threadpool
 from starlette.middleware.sessions import SessionMiddleware
+from starlette.types import ASGIApp, Receive, Scope, Send
 
+from . import recommendations, templating, writes
+from .assets import AssetFiles, load_manifest
 from .auth import hash_password
-from .database import SessionLocal, engine
-from .models import User, create_tables
+from .cache import advance, bump, create_version_triggers, poll
+from .compression import CompressionMiddleware
+from .database import OPTIMIZE_INTERVAL, Base, SessionLocal, engine, optimize
+from .metrics import MetricsMiddleware
+from .models import (
+    RATING_AVG_SQL,
+    RATING_BUCKETS,
+    RATING_ORDER_SQL,
+    Book,
+    Feedback,
+    User,
+    create_tables,
+)
+from .ratings import create_rating_triggers
+from .routers import (
+    admin,
+    books,
+    bulk,
+    events,
+    feedbacks,
+    metrics,
+    search,
+    stats,
+    sync,
+    users,
+    views,
+)
 from .routers import auth as auth_router
-from .routers import books, feedbacks, users, views
+from .search import create_search_index
+from .stats import create_stats_triggers
+from .sync import (
+    PRUNE_INTERVAL,
+    TOMBSTONE_RETENTION,
+    create_sync_triggers,
+    prune_tombstones,
+)
+from .workers import shared_setting, startup_lock, try_lock
 
 logger = logging.getLogger("rose")
 
+# How often each worker process checks for writes made by the others, in
+# milliseconds.
+VERSION_POLL_MS = int(os.environ.get("VERSION_POLL_MS", 100))
+
 
 def _seed_admin() -> None:
     """Create the first admin user if the users table is empty."""
@@ -42,39 +84,276 @@ def _seed_admin() -> None:
         db.close()
 
 
+# (table, column, column DDL, optional backfill statement)
+_NEW_COLUMNS = [
+    ("users", "is_admin", "INTEGER NOT NULL DEFAULT 0", None),
+    ("users", "updated_at", "DATETIME", "UPDATE users SET updated_at = created_at"),
+    ("books", "updated_at", "DATETIME", "UPDATE books SET updated_at = created_at"),
+    (
+        "feedbacks",
+        "updated_at",
+        "DATETIME",
+        "UPDATE feedbacks SET updated_at = created_at",
+    ),
+    # Filled in by ratings.repair() once the rating triggers are created.
+    ("books", "feedback_count", "INTEGER NOT NULL DEFAULT 0", None),
+    ("books", "rating_count", "INTEGER NOT NULL DEFAULT 0", None),
+    ("books", "rating_sum", "FLOAT NOT NULL DEFAULT 0", None),
+    (
+        "books",
+        "rating_histogram",
+        f"JSON NOT NULL DEFAULT '{str([0] * RATING_BUCKETS).replace(' ', '')}'",
+        None,
+    ),
+    ("books", "rating_avg", f"FLOAT GENERATED ALWAYS AS ({RATING_AVG_SQL})", None),
+    (
+        "books",
+        "rating_order",
+        f"FLOAT GENERATED ALWAYS AS ({RATING_ORDER_SQL})",
+        None,
+    ),
+]
+
+
 def _migrate(engine) -> None:
     """Apply any schema changes that create_all cannot handle (e.g. new columns)."""
     with engine.connect() as conn:
-        # Add is_admin column to users if it doesn't exist yet (SQLite has no
-        # IF NOT EXISTS for ALTER TABLE ADD COLUMN, so inspect first).
-        cols = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(users)")}
-        if "is_admin" in cols:
-            return
-        conn.exec_driver_sql(
-            "ALTER TABLE users ADD COLUMN is_admin INTEGER NOT NULL DEFAULT 0"
-        )
+        # Add columns that don't exist yet (SQLite has no IF NOT EXISTS for
+        # ALTER TABLE ADD COLUMN, so inspect first), then backfill them.
+        for table, column, ddl, backfill in _NEW_COLUMNS:
+            cols = {
+                row[1] for row in conn.exec_driver_sql(f"PRAGMA table_xinfo({table})")
+            }
+            if column in cols:
+                continue
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+            if backfill:
+                conn.exec_driver_sql(backfill)
+            logger.info("Migration applied: added %s.%s column", table, column)
+
+        # create_all only creates missing tables, so indexes added to the
+        # models later have to be created on existing databases here.
+        existing = {
+            row[0]
+            for row in conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'"
+            )
+        }
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+                    logger.info("Migration applied: created index %s", index.name)
         conn.commit()
-        logger.info("Migration applied: added users.is_admin column")
+        _rebuild_tables(conn)
 
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    create_tables(engine)
-    _migrate(engine)
-    _seed_admin()
-    yield
+def _rebuild_tables(conn) -> None:
+    """Rebuild tables whose definitions predate their models: books,
+    feedbacks and users without AUTOINCREMENT, and feedbacks without ON
+    DELETE CASCADE foreign keys. Neither can be changed in place."""
+    for model in (User, Book, Feedback):
+        name = model.__tablename__
+        sql = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?",
+            (name,),
+        ).scalar()
+        stale = "AUTOINCREMENT" not in sql.upper()
+        if model is Feedback:
+            fks = conn.exec_driver_sql("PRAGMA foreign_key_list(feedbacks)").all()
+            stale = stale or not (fks and all(fk[6] == "CASCADE" for fk in fks))
+        if stale:
+            _rebuild(conn, model.__table__)
+
+
+def _rebuild(conn, table) -> None:
+    """Recreate `table` from its model, keeping its rows and ids.
+
+    This follows SQLite's documented recipe: copy the rows into a new table,
+    swap it in and recreate the indexes and triggers, in one transaction
+    with foreign key enforcement off. legacy_alter_table stops the rename
+    from re-checking triggers on other tables that name this one while it
+    is briefly missing.
+    """
+    name = table.name
+    cols = ", ".join(c.name for c in table.columns if c.computed is None)
+    create = str(CreateTable(table).compile(dialect=conn.dialect)).replace(
+        f"CREATE TABLE {name}", f"CREATE TABLE {name}_new", 1
+    )
+    dependents = [
+        row[0]
+        for row in conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE tbl_name = ? "
+            "AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+            (name,),
+        )
+    ]
+    valid, orphans = "1", 0
+    if table is Feedback.__table__:
+        # Feedbacks whose book or user is already gone would violate the
+        # cascading constraints; they were unreachable anyway and are not
+        # copied.
+        valid = (
+            "user_id IN (SELECT id FROM users) AND book_id IN (SELECT id FROM books)"
+        )
+        orphans = conn.exec_driver_sql(
+            f"SELECT count(*) FROM feedbacks WHERE NOT ({valid})"
+        ).scalar()
+    conn.commit()
+    script = [
+        "PRAGMA foreign_keys = OFF",
+        "PRAGMA legacy_alter_table = ON",
+        "BEGIN",
+        create,
+        f"INSERT INTO {name}_new ({cols}) SELECT {cols} FROM {name} WHERE {valid}",
+        # Ids already deleted (the newest may have been) are not reused
+        # either.
+        f"INSERT INTO sqlite_sequence (name, seq) SELECT '{name}_new', 0 "
+        f"WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = '{name}_new')",
+        f"UPDATE sqlite_sequence SET seq = max(seq, (SELECT ifnull(max(row_id), 0) "
+        f"FROM tombstones WHERE table_name = '{name}')) WHERE name = '{name}_new'",
+        f"DROP TABLE {name}",
+        f"ALTER TABLE {name}_new RENAME TO {name}",
+        *dependents,
+        "COMMIT",
+        "PRAGMA legacy_alter_table = OFF",
+        "PRAGMA foreign_keys = ON",
+    ]
+    conn.connection.driver_connection.executescript(";\n".join(script) + ";")
+    if orphans:
+        logger.warning(
+            "Dropped %d feedbacks whose book or user no longer exists", orphans
+        )
+    logger.info("Migration applied: rebuilt %s with its current constraints", name)
+
+
+async def _optimize_periodically() -> None:
+    while True:
+        await asyncio.sleep(OPTIMIZE_INTERVAL)
+        try:
+            await run_in_threadpool(optimize, engine)
+        except Exception:
+            logger.exception("PRAGMA optimize failed")
+
+
+async def _poll_versions_periodically() -> None:
+    while True:
+        await asyncio.sleep(VERSION_POLL_MS / 1000)
+        try:
+            poll()
+        except Exception:
+            logger.exception("Reading write versions failed")
 
 
-SECRET_KEY = os.environ.get("SECRET_KEY")
-if not SECRET_KEY:
-    SECRET_KEY = secrets.token_hex(32)
+async def _prune_tombstones_periodically() -> None:
+    while True:
+        try:
+            if pruned := await run_in_threadpool(prune_tombstones, engine):
+                logger.info("Pruned %d sync tombstones", pruned)
+        except Exception:
+            logger.exception("Pruning sync tombstones failed")
+        await asyncio.sleep(PRUNE_INTERVAL)
+
+
+def _rebuild_recommendations() -> bool:
+    # Every worker runs the timer; whichever holds the lock builds, and the
+    # shared fingerprint stops the others repeating its work afterwards.
+    with try_lock("recommendations") as leader:
+        if not leader or not recommendations.build(engine):
+            return False
+    with engine.begin() as conn:
+        advance(conn, "recommendations")
+    return True
+
+
+async def _refresh_recommendations_periodically() -> None:
+    while True:
+        try:
+            if await run_in_threadpool(_rebuild_recommendations):
+                bump("recommendations")
+        except Exception:
+            logger.exception("Rebuilding recommendations failed")
+        await asyncio.sleep(recommendations.REFRESH_INTERVAL)
+
+
+def _generate_secret_key() -> str:
     logger.warning(
-        "SECRET_KEY not set — using a random key. "
-        "Sessions will not survive a restart. Set SECRET_KEY in production."
+        "SECRET_KEY not set — generated a random key and stored it in the "
+        "database. Set SECRET_KEY in production."
     )
+    return secrets.token_hex(32)
+
+
+def _secret_key() -> str:
+    """SECRET_KEY, or without it a random key generated once and kept in the
+    database, so every worker process signs sessions alike and they survive
+    restarts."""
+    return os.environ.get("SECRET_KEY") or shared_setting(
+        engine, "secret_key", _generate_secret_key
+    )
+
+
+class _Sessions:
+    """SessionMiddleware, built on the first request instead of at import,
+    so importing the app (bench tools, the reloader) does not open the
+    database to look up the signing key."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.sessions: SessionMiddleware | None = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        if self.sessions is None:
+            self.sessions = SessionMiddleware(
+                self.app, secret_key=_secret_key(), https_only=False
+            )
+        await self.sessions(scope, receive, send)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # With several workers, the first to get here migrates and seeds; the
+    # others wait their turn and find it done.
+    with startup_lock():
+        create_tables(engine)
+        _migrate(engine)
+        create_search_index(engine)
+        create_sync_triggers(engine)
+        create_rating_triggers(engine)
+        create_stats_triggers(engine)
+        create_version_triggers(engine, ("recommendations",))
+        _seed_admin()
+    # Outside the startup lock, which storing a generated key takes itself.
+    _secret_key()
+    load_manifest()
+    if templating.TEMPLATE_PRECOMPILE:
+        count, seconds = templating.precompile()
+        logger.info("Precompiled %d templates in %.3fs", count, seconds)
+    if writes.WRITE_QUEUE:
+        writes.queue.start()
+    tasks = [asyncio.create_task(_poll_versions_periodically())]
+    if OPTIMIZE_INTERVAL > 0:
+        tasks.append(asyncio.create_task(_optimize_periodically()))
+    if recommendations.REFRESH_INTERVAL > 0:
+        tasks.append(asyncio.create_task(_refresh_recommendations_periodically()))
+    if TOMBSTONE_RETENTION:
+        tasks.append(asyncio.create_task(_prune_tombstones_periodically()))
+    yield
+    await writes.queue.stop()
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
 
 app = FastAPI(title="Rose by Any Name", lifespan=lifespan)
-app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY, https_only=False)
+app.add_middleware(_Sessions)
+app.add_middleware(CompressionMiddleware)
+# Outermost, so request timings include compression and sessions.
+app.add_middleware(MetricsMiddleware)
 
 # Auth
 app.include_router(auth_router.router)
@@ -83,9 +362,16 @@ app.include_router(auth_router.router)
 app.include_router(users.router)
 app.include_router(books.router)
 app.include_router(feedbacks.router)
+app.include_router(search.router)
+app.include_router(sync.router)
+app.include_router(bulk.router)
+app.include_router(stats.router)
+app.include_router(events.router)
+app.include_router(admin.router)
+app.include_router(metrics.router)
 
 # UI pages (htmx + Jinja2)
 app.include_router(views.router)
 
 # Static assets
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", AssetFiles(directory="static"), name="static")
@@ -0,0 +1,356 @@
+"""Request, SQL and template timings, exposed in Prometheus format at /metrics.
+
+MetricsMiddleware gives every request a RequestTimings that the engine's
+cursor hooks (see database.py), template rendering (see templating.py) and
+TimedRoute add to as the request is served. When the request ends its
+totals go into per-route histograms and counters. With SERVER_TIMING=1 each
+response also carries the breakdown in a Server-Timing header, which
+browser developer tools display next to the request.
+"""
+
+import functools
+import inspect
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from fastapi import Response
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+# When set, /metrics answers only requests sending
+# `Authorization: Bearer <METRICS_TOKEN>`.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN") or None
+# How many of the slowest distinct statements to keep.
+SLOW_STATEMENTS = int(os.environ.get("METRICS_SLOW_STATEMENTS", 10))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RequestTimings:
+    """What one request spent, in seconds, on each kind of work."""
+
+    __slots__ = ("queries", "sql", "render", "serialize", "returned")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql = self.render = self.serialize = 0.0
+        # When the endpoint handed its result to FastAPI to serialize.
+        self.returned = 0.0
+
+    def server_timing(self, total: float) -> str:
+        return ", ".join(
+            [
+                f'sql;dur={self.sql * 1000:.2f};desc="{self.queries} queries"',
+                f"render;dur={self.render * 1000:.2f}",
+                f"serialize;dur={self.serialize * 1000:.2f}",
+                f"total;dur={total * 1000:.2f}",
+            ]
+        )
+
+
+# Set for the duration of each request. Starlette copies the context into the
+# threadpool, and run_sync keeps it in async mode, so database work sees it.
+_current: ContextVar[RequestTimings | None] = ContextVar("timings", default=None)
+
+
+def current() -> RequestTimings | None:
+    return _current.get()
+
+
+# ── Registry ──────────────────────────────────────────────────────────────────
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, as Prometheus expects."""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...], buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            # One count per bucket, then +Inf, sum.
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += 1
+        series[-1] += value
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            base = _labels(self.labels, labels)
+            for bound, count in zip(self.buckets, series):
+                le = _labels(self.labels + ("le",), labels + (_number(bound),))
+                lines.append(f"{self.name}_bucket{le} {count}")
+            le = _labels(self.labels + ("le",), labels + ("+Inf",))
+            lines.append(f"{self.name}_bucket{le} {series[-2]}")
+            lines.append(f"{self.name}_sum{base} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{base} {series[-2]}")
+        return lines
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _counter(name: str, help: str, names: tuple, values: dict) -> list[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} counter"]
+    lines.extend(
+        f"{name}{_labels(names, labels)} {_number(value)}"
+        for labels, value in sorted(values.items())
+    )
+    return lines
+
+
+class Registry:
+    """Everything /metrics reports since the process started.
+
+    Requests are recorded from the event loop; statements from whichever
+    thread ran them, so those counters are updated under a lock.
+    """
+
+    def __init__(self):
+        route = ("method", "route")
+        self.latency = Histogram(
+            "rose_http_request_duration_seconds",
+            "Time from receiving a request to the end of its response.",
+            route,
+            LATENCY_BUCKETS,
+        )
+        self.queries = Histogram(
+            "rose_db_queries_per_request",
+            "SQL statements executed while serving one request.",
+            route,
+            QUERY_BUCKETS,
+        )
+        self.write_batches = Histogram(
+            "rose_write_batch_size",
+            "Writes committed together by the group-commit writer.",
+            (),
+            BATCH_BUCKETS,
+        )
+        self.requests: dict[tuple, int] = {}
+        self.sql: dict[tuple, float] = {}
+        self.render: dict[tuple, float] = {}
+        self.serialize: dict[tuple, float] = {}
+        self.statements = 0
+        self.statement_seconds = 0.0
+        self.slowest: dict[str, float] = {}
+        self._floor = 0.0
+        self._lock = threading.Lock()
+
+    def record_request(
+        self, method: str, route: str, status: int, seconds: float, t: RequestTimings
+    ) -> None:
+        labels = (method, route)
+        key = (method, route, str(status))
+        self.requests[key] = self.requests.get(key, 0) + 1
+        self.latency.observe(labels, seconds)
+        self.queries.observe(labels, t.queries)
+        for totals, value in (
+            (self.sql, t.sql),
+            (self.render, t.render),
+            (self.serialize, t.serialize),
+        ):
+            totals[labels] = totals.get(labels, 0.0) + value
+
+    def record_statement(self, statement: str, seconds: float) -> None:
+        with self._lock:
+            self.statements += 1
+            self.statement_seconds += seconds
+            if seconds <= self._floor and len(self.slowest) >= SLOW_STATEMENTS:
+                return
+            if seconds > self.slowest.get(statement, 0.0):
+                self.slowest[statement] = seconds
+            if len(self.slowest) > SLOW_STATEMENTS:
+                del self.slowest[min(self.slowest, key=self.slowest.get)]
+            if len(self.slowest) >= SLOW_STATEMENTS:
+                self._floor = min(self.slowest.values())
+
+    def expose(self) -> str:
+        route = ("method", "route")
+        with self._lock:
+            statements, statement_seconds = self.statements, self.statement_seconds
+            slowest = sorted(self.slowest.items(), key=lambda s: -s[1])
+        lines = [
+            *_counter(
+                "rose_http_requests_total",
+                "Requests served, by route and status code.",
+                route + ("status",),
+                self.requests,
+            ),
+            *self.latency.expose(),
+            *self.queries.expose(),
+            *self.write_batches.expose(),
+            *_counter(
+                "rose_db_request_seconds_total",
+                "Time spent executing SQL while serving requests.",
+                route,
+                self.sql,
+            ),
+            *_counter(
+                "rose_template_render_seconds_total",
+                "Time spent rendering Jinja templates while serving requests.",
+                route,
+                self.render,
+            ),
+            *_counter(
+                "rose_serialization_seconds_total",
+                "Time spent validating and serializing response models.",
+                route,
+                self.serialize,
+            ),
+            "# HELP rose_db_statements_total SQL statements executed, "
+            "including outside requests.",
+            "# TYPE rose_db_statements_total counter",
+            f"rose_db_statements_total {statements}",
+            "# HELP rose_db_statement_seconds_total Time spent executing them.",
+            "# TYPE rose_db_statement_seconds_total counter",
+            f"rose_db_statement_seconds_total {_number(statement_seconds)}",
+            "# HELP rose_db_slowest_statement_seconds Longest single execution "
+            "of each of the slowest statements seen.",
+            "# TYPE rose_db_slowest_statement_seconds gauge",
+        ]
+        lines.extend(
+            f"rose_db_slowest_statement_seconds"
+            f"{_labels(('statement',), (' '.join(sql.split()),))} {_number(seconds)}"
+            for sql, seconds in slowest
+        )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+# ── SQL hooks ─────────────────────────────────────────────────────────────────
+# Listeners for the engine's before/after_cursor_execute events. The start
+# time is kept on the connection, which only one thread uses at a time.
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+    seconds = time.perf_counter() - conn.info["query_start"].pop()
+    registry.record_statement(statement, seconds)
+    timings = _current.get()
+    if timings is not None:
+        timings.queries += 1
+        timings.sql += seconds
+
+
+# ── Serialization ─────────────────────────────────────────────────────────────
+
+
+class TimedRoute(APIRoute):
+    """Route class for API routers: measures the time FastAPI takes to
+    validate and serialize what an endpoint returns into its response model.
+    Endpoints returning a Response themselves have nothing to measure."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if inspect.iscoroutinefunction(endpoint):
+            endpoint = _mark_return(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            timings = _current.get()
+            if timings is not None and timings.returned:
+                timings.serialize += time.perf_counter() - timings.returned
+                timings.returned = 0.0
+            return response
+
+        return timed_handler
+
+
+def _mark_return(endpoint):
+    # functools.wraps keeps the signature FastAPI reads parameters from.
+    @functools.wraps(endpoint)
+    async def marked(*args, **kwargs):
+        result = await endpoint(*args, **kwargs)
+        timings = _current.get()
+        if timings is not None and not isinstance(result, Response):
+            timings.returned = time.perf_counter()
+        return result
+
+    return marked
+
+
+# ── Middleware ────────────────────────────────────────────────────────────────
+
+
+def _route(scope: Scope) -> str:
+    """The route template that served the request, so paths like
+    /books/1 and /books/2 share one series."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Mounted apps (static files) are reported under their mount point.
+    return scope.get("root_path") or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_timed(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing",
+                        timings.server_timing(time.perf_counter() - start),
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_timed)
+        finally:
+            _current.reset(token)
+            registry.record_request(
+                scope["method"],
+                _route(scope),
+                status,
+                time.perf_counter() - start,
+                timings,
+            )
@@ -1,11 +1,14 @@
 from datetime import datetime
 
 from sqlalchemy import (
+    JSON,
     Boolean,
     Column,
+    Computed,
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -14,9 +17,17 @@ from sqlalchemy.orm import relationship
 
 from .database import Base
 
+# Books, feedbacks and users use AUTOINCREMENT so a deleted id is never
+# handed to a new row: a sync client that saw the id deleted (rose/sync.py)
+# can drop it for good.
+
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_surname_name", "surname", "name"),
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
@@ -25,41 +36,183 @@ class User(Base):
     password = Column(String(255), nullable=False)
     is_admin = Column(Boolean, default=False, nullable=False, server_default="0")
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True
+    )
 
     feedbacks = relationship(
-        "Feedback", back_populates="user", cascade="all, delete-orphan"
+        "Feedback",
+        back_populates="user",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
+# Ratings run from 0 to 10; the histogram counts them per whole point.
+RATING_BUCKETS = 11
+RATING_AVG_SQL = "rating_sum / NULLIF(rating_count, 0)"
+RATING_ORDER_SQL = f"COALESCE({RATING_AVG_SQL}, -1)"
+
+
 class Book(Base):
     __tablename__ = "books"
+    __table_args__ = (
+        Index("ix_books_rating_order_id", "rating_order", "id"),
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    title = Column(String(255), nullable=False)
+    title = Column(String(255), nullable=False, index=True)
     author = Column(String(255), nullable=False)
     publishing_year = Column(Integer, nullable=True)
     number_of_pages = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True
+    )
+
+    # Rating aggregates, kept current by the feedback triggers in
+    # rose/ratings.py. rating_order is the "top rated" sort key: the average,
+    # or -1 for unrated books so keyset comparisons never meet NULL.
+    feedback_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Float, nullable=False, default=0.0, server_default="0")
+    rating_histogram = Column(
+        JSON,
+        nullable=False,
+        default=lambda: [0] * RATING_BUCKETS,
+        server_default=str([0] * RATING_BUCKETS).replace(" ", ""),
+    )
+    rating_avg = Column(Float, Computed(RATING_AVG_SQL, persisted=False))
+    rating_order = Column(Float, Computed(RATING_ORDER_SQL, persisted=False))
 
     feedbacks = relationship(
-        "Feedback", back_populates="book", cascade="all, delete-orphan"
+        "Feedback",
+        back_populates="book",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
 class Feedback(Base):
     __tablename__ = "feedbacks"
+    # Per-book and per-user listings filter on the owner and sort newest first.
+    __table_args__ = (
+        Index("ix_feedbacks_book_id_created_at", "book_id", "created_at"),
+        Index("ix_feedbacks_user_id_created_at", "user_id", "created_at"),
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
+    # SQLite removes a book's or user's feedbacks itself (passive_deletes on
+    # the relationships), so the ORM never loads them just to delete them.
+    user_id = Column(
+        Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False
+    )
+    book_id = Column(
+        Integer, ForeignKey("books.id", ondelete="CASCADE"), nullable=False
+    )
     rating = Column(Float, nullable=True)
     review = Column(Text, nullable=True)
     year_of_reading = Column(Integer, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    updated_at = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True
+    )
 
     user = relationship("User", back_populates="feedbacks")
     book = relationship("Book", back_populates="feedbacks")
 
 
+class Tombstone(Base):
+    """One row per deleted book, feedback or user, written by the triggers in
+    rose/sync.py so cascaded deletes are recorded too. AUTOINCREMENT keeps ids
+    strictly increasing, which the sync cursor relies on."""
+
+    __tablename__ = "tombstones"
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String(32), nullable=False)
+    row_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, nullable=False)
+
+
+# ── Reading statistics rollups ────────────────────────────────────────────────
+# Maintained by the triggers in rose/stats.py. Rows with user_id EVERYONE hold
+# the site-wide totals; user ids start at 1, so it cannot clash.
+
+EVERYONE = 0
+
+
+class ReadingYear(Base):
+    """Books read and pages read per user and year_of_reading."""
+
+    __tablename__ = "stats_years"
+
+    user_id = Column(Integer, primary_key=True)
+    year = Column(Integer, primary_key=True)
+    books = Column(Integer, nullable=False, default=0)
+    pages = Column(Integer, nullable=False, default=0)
+
+
+class RatingCount(Base):
+    """How many ratings a user gave per whole point (0-10)."""
+
+    __tablename__ = "stats_ratings"
+
+    user_id = Column(Integer, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ReadingTotal(Base):
+    """Books read by a user in all (one row per user)."""
+
+    __tablename__ = "stats_totals"
+
+    user_id = Column(Integer, primary_key=True)
+    books = Column(Integer, nullable=False, default=0)
+
+
+class AuthorCount(Base):
+    """How many books by each author a user has read."""
+
+    __tablename__ = "stats_authors"
+
+    user_id = Column(Integer, primary_key=True)
+    author = Column(String(255), primary_key=True)
+    books = Column(Integer, nullable=False, default=0)
+
+
+# Serves "most read authors" straight from the index, ties alphabetical.
+Index(
+    "ix_stats_authors_top",
+    AuthorCount.user_id,
+    AuthorCount.books.desc(),
+    AuthorCount.author,
+)
+
+
+# ── Recommendations ───────────────────────────────────────────────────────────
+
+
+class BookNeighbour(Base):
+    """The books most often liked by readers of `book_id`, best first. Rebuilt
+    by rose/recommendations.py; deleting either book removes the row."""
+
+    __tablename__ = "book_neighbours"
+    __table_args__ = (Index("ix_book_neighbours_neighbour_id", "neighbour_id"),)
+
+    book_id = Column(
+        Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True
+    )
+    rank = Column(Integer, primary_key=True)
+    neighbour_id = Column(
+        Integer, ForeignKey("books.id", ondelete="CASCADE"), nullable=False
+    )
+    score = Column(Float, nullable=False)
+
+
 def create_tables(engine):
     Base.metadata.create_all(bind=engine)
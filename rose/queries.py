@@ -0,0 +1,71 @@
+from sqlalchemy.orm import Query, Session, joinedload
+
+from .models import Book, Feedback, User
+from .pagination import Page, PageParams, paginate
+
+# Sort keys for every listing. Each ends with the primary key so keyset
+# pagination has a total order to resume from.
+BOOK_ORDER = (Book.title, Book.id)
+BOOK_RATING_ORDER = (Book.rating_order, Book.id)  # best rated first
+USER_ORDER = (User.surname, User.name, User.id)
+FEEDBACK_ORDER = (Feedback.created_at, Feedback.id)  # newest first
+
+# ── Book ──────────────────────────────────────────────────────────────────────
+
+
+def list_books(
+    db: Session, page: PageParams, sort: str = "title", options: tuple = ()
+) -> Page:
+    query = db.query(Book).options(*options)
+    if sort == "rating":
+        return paginate(query, BOOK_RATING_ORDER, page, descending=True)
+    return paginate(query, BOOK_ORDER, page)
+
+
+# ── User ──────────────────────────────────────────────────────────────────────
+
+
+def list_users(db: Session, page: PageParams, options: tuple = ()) -> Page:
+    return paginate(db.query(User).options(*options), USER_ORDER, page)
+
+
+# ── Feedback ──────────────────────────────────────────────────────────────────
+
+# Every feedback listing renders the owning user and book, so both many-to-one
+# relationships are joined into the same SELECT instead of lazy-loading them
+# one row at a time.
+_FEEDBACK_OPTIONS = (joinedload(Feedback.user), joinedload(Feedback.book))
+
+
+def feedback_query(db: Session) -> Query:
+    """Base feedback query with user and book eagerly loaded."""
+    return db.query(Feedback).options(*_FEEDBACK_OPTIONS)
+
+
+def get_feedback(
+    db: Session, feedback_id: int, reload: bool = False
+) -> Feedback | None:
+    """Fetch one feedback with user and book loaded. Pass reload=True after a
+    write so an instance already in the session is refreshed in place."""
+    return db.get(
+        Feedback, feedback_id, options=_FEEDBACK_OPTIONS, populate_existing=reload
+    )
+
+
+def list_feedbacks(db: Session, page: PageParams, options: tuple | None = None) -> Page:
+    """Pass `options` (such as a load_only()) to load feedbacks without
+    their user and book."""
+    query = feedback_query(db) if options is None else db.query(Feedback)
+    return paginate(
+        query.options(*options or ()), FEEDBACK_ORDER, page, descending=True
+    )
+
+
+def list_book_feedbacks(db: Session, book_id: int, page: PageParams) -> Page:
+    query = feedback_query(db).filter(Feedback.book_id == book_id)
+    return paginate(query, FEEDBACK_ORDER, page, descending=True)
+
+
+def list_user_feedbacks(db: Session, user_id: int, page: PageParams) -> Page:
+    query = feedback_query(db).filter(Feedback.user_id == user_id)
+    return paginate(query, FEEDBACK_ORDER, page, descending=True)
@@ -0,0 +1,117 @@
+"""Per-book rating aggregates.
+
+Recompute every book's aggregates from its feedbacks:
+
+uv run python -m rose.ratings
+"""
+
+import logging
+
+from .models import RATING_BUCKETS
+
+logger = logging.getLogger("rose")
+
+# ── Triggers ──────────────────────────────────────────────────────────────────
+# Every feedback INSERT, DELETE and rating/book change adjusts the owning
+# book's counters in the same transaction, whichever code path issues it:
+# the API, bulk imports, or cascades from a deleted user. Reads then never
+# aggregate. updated_at moves too, so sync clients pick up the new figures;
+# it is written in the same text format SQLAlchemy uses.
+
+_NOW = "strftime('%Y-%m-%d %H:%M:%f000', 'now')"
+
+
+def _bucket(row: str) -> str:
+    return f"'$[' || CAST({row}.rating AS INTEGER) || ']'"
+
+
+def _adjust(row: str, sign: str) -> str:
+    """UPDATE adding (sign '+') or removing (sign '-') one feedback row."""
+    path = _bucket(row)
+    return (
+        f"UPDATE books SET "
+        f"feedback_count = feedback_count {sign} 1, "
+        f"rating_count = rating_count {sign} ({row}.rating IS NOT NULL), "
+        f"rating_sum = rating_sum {sign} COALESCE({row}.rating, 0), "
+        f"rating_histogram = CASE WHEN {row}.rating IS NULL THEN rating_histogram "
+        f"ELSE json_set(rating_histogram, {path}, "
+        f"json_extract(rating_histogram, {path}) {sign} 1) END, "
+        f"updated_at = {_NOW} "
+        f"WHERE id = {row}.book_id;"
+    )
+
+
+_TRIGGERS = {
+    "feedbacks_rating_ai": (
+        f"AFTER INSERT ON feedbacks BEGIN {_adjust('new', '+')} END"
+    ),
+    "feedbacks_rating_ad": (
+        f"AFTER DELETE ON feedbacks BEGIN {_adjust('old', '-')} END"
+    ),
+    "feedbacks_rating_au": (
+        f"AFTER UPDATE OF rating, book_id ON feedbacks BEGIN "
+        f"{_adjust('old', '-')} {_adjust('new', '+')} END"
+    ),
+}
+
+
+def create_rating_triggers(engine) -> None:
+    """Create the aggregate triggers if missing. A database that had feedbacks
+    before the triggers existed is brought up to date with repair()."""
+    with engine.connect() as conn:
+        existing = {
+            row[0]
+            for row in conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger'"
+            )
+        }
+        missing = [name for name in _TRIGGERS if name not in existing]
+        for name in missing:
+            conn.exec_driver_sql(f"CREATE TRIGGER {name} {_TRIGGERS[name]}")
+        conn.commit()
+    if missing:
+        logger.info("Rating triggers created: %s", ", ".join(missing))
+        repair(engine)
+
+
+# ── Repair ────────────────────────────────────────────────────────────────────
+
+
+def repair(engine) -> int:
+    """Recompute every book's aggregates from scratch in one transaction and
+    return how many books were corrected."""
+    histogram = ", ".join(
+        f"COUNT(CASE WHEN CAST(rating AS INTEGER) = {i} THEN 1 END)"
+        for i in range(RATING_BUCKETS)
+    )
+    empty = str([0] * RATING_BUCKETS).replace(" ", "")
+    with engine.begin() as conn:
+        reset = conn.exec_driver_sql(
+            f"UPDATE books SET feedback_count = 0, rating_count = 0, rating_sum = 0, "
+            f"rating_histogram = '{empty}', updated_at = {_NOW} "
+            f"WHERE id NOT IN (SELECT book_id FROM feedbacks) "
+            f"AND (feedback_count, rating_count, rating_sum, json(rating_histogram)) "
+            f"IS NOT (0, 0, 0, '{empty}')"
+        ).rowcount
+        fixed = conn.exec_driver_sql(
+            f"UPDATE books SET feedback_count = agg.n, rating_count = agg.rated, "
+            f"rating_sum = agg.total, rating_histogram = agg.histogram, "
+            f"updated_at = {_NOW} "
+            f"FROM (SELECT book_id, COUNT(*) AS n, COUNT(rating) AS rated, "
+            f"TOTAL(rating) AS total, json_array({histogram}) AS histogram "
+            f"FROM feedbacks GROUP BY book_id) AS agg "
+            f"WHERE books.id = agg.book_id "
+            f"AND (feedback_count, rating_count, rating_sum, json(rating_histogram)) "
+            f"IS NOT (agg.n, agg.rated, agg.total, agg.histogram)"
+        ).rowcount
+    return reset + fixed
+
+
+def main() -> None:
+    from .database import engine
+
+    print(f"{repair(engine)} books corrected")
+
+
+if __name__ == "__main__":
+    main()
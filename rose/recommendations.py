@@ -0,0 +1,184 @@
+"""Item-item "readers also liked" recommendations from the feedback matrix.
+
+Rebuild the neighbour lists now:
+
+uv run python -m rose.recommendations
+"""
+
+import json
+import logging
+import math
+import os
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from .models import Book, BookNeighbour
+from .workers import get_setting, put_setting
+
+logger = logging.getLogger("rose")
+
+# Neighbours kept per book.
+TOP_K = int(os.environ.get("RECOMMENDATIONS_TOP_K", 12))
+# Seconds between rebuilds; 0 disables the background refresh.
+REFRESH_INTERVAL = int(os.environ.get("RECOMMENDATIONS_INTERVAL", 3600))
+# Readers with more feedbacks than this are left out: each reader adds
+# n^2 book pairs, and a handful of catalogue-wide readers say little about
+# which books go together.
+MAX_READER_BOOKS = int(os.environ.get("RECOMMENDATIONS_MAX_READER_BOOKS", 500))
+# Shrinks similarities built on few common readers towards zero.
+SHRINKAGE = 5
+# Books whose pairs are aggregated per query; bounds the size of SQLite's sort.
+CHUNK_BOOKS = 2000
+
+# ── Build ─────────────────────────────────────────────────────────────────────
+# A reader's feedback on a book is a weight in [0, 1]: the rating / 10, or 0.5
+# for a book read without rating. Similarity is the cosine between two books'
+# reader vectors, times co / (co + SHRINKAGE) for co common readers.
+#
+# The sparse product is computed by SQLite as a self-join on reader, one chunk
+# of books at a time, with a window function keeping each book's TOP_K. The
+# query ranks by the squared score so it needs no sqrt(), which not every
+# SQLite build has. Each chunk's neighbours are written in a short
+# transaction of their own, so the write lock is never held while computing.
+
+_WEIGHTS = (
+    "CREATE TEMP TABLE rec_weights AS "
+    "SELECT user_id, book_id, COALESCE(rating, 5.0) / 10.0 AS w FROM feedbacks "
+    "WHERE COALESCE(rating, 5.0) > 0 AND user_id IN ("
+    "SELECT user_id FROM feedbacks GROUP BY user_id HAVING COUNT(*) <= {max_books})"
+)
+_NORMS = (
+    "CREATE TEMP TABLE rec_norms AS "
+    "SELECT book_id, SUM(w * w) AS sq FROM rec_weights GROUP BY book_id"
+)
+_PAIRS = (
+    "SELECT book_id, neighbour_id, co, dot, sq_a, sq_b FROM ("
+    "SELECT a.book_id, b.book_id AS neighbour_id, COUNT(*) AS co, "
+    "SUM(a.w * b.w) AS dot, na.sq AS sq_a, nb.sq AS sq_b, "
+    "ROW_NUMBER() OVER (PARTITION BY a.book_id ORDER BY "
+    "SUM(a.w * b.w) * SUM(a.w * b.w) / (na.sq * nb.sq) "
+    "* (COUNT(*) * 1.0 / (COUNT(*) + :shrink)) "
+    "* (COUNT(*) * 1.0 / (COUNT(*) + :shrink)) DESC, b.book_id) AS rank "
+    "FROM rec_weights AS a "
+    "JOIN rec_weights AS b ON b.user_id = a.user_id AND b.book_id != a.book_id "
+    "JOIN rec_norms AS na ON na.book_id = a.book_id "
+    "JOIN rec_norms AS nb ON nb.book_id = b.book_id "
+    "WHERE a.book_id >= :lo AND a.book_id < :hi "
+    "GROUP BY a.book_id, b.book_id"
+    ") WHERE rank <= :k ORDER BY book_id, rank"
+)
+
+# Feedback count, last change and last delete: when none has moved since the
+# previous build there is nothing new to learn. Kept in the settings table,
+# so a build by one worker process counts for all of them.
+_FINGERPRINT = (
+    "SELECT (SELECT COUNT(*) FROM feedbacks), "
+    "(SELECT MAX(updated_at) FROM feedbacks), (SELECT MAX(id) FROM tombstones)"
+)
+_FINGERPRINT_SETTING = "recommendations_fingerprint"
+
+
+def _neighbours(rows) -> list[dict]:
+    out, rank, previous = [], 0, None
+    for book_id, neighbour_id, co, dot, sq_a, sq_b in rows:
+        rank = rank + 1 if book_id == previous else 1
+        previous = book_id
+        score = dot / math.sqrt(sq_a * sq_b) * co / (co + SHRINKAGE)
+        out.append(
+            {
+                "book_id": book_id,
+                "rank": rank,
+                "neighbour_id": neighbour_id,
+                "score": round(score, 6),
+            }
+        )
+    return out
+
+
+def build(engine, force: bool = False) -> bool:
+    """Recompute every book's neighbour list. Returns False when the feedbacks
+    have not changed since the last build (unless `force`)."""
+    started = time.perf_counter()
+    with engine.connect() as conn:
+        fingerprint = json.dumps(list(conn.exec_driver_sql(_FINGERPRINT).one()))
+        if fingerprint == get_setting(engine, _FINGERPRINT_SETTING) and not force:
+            return False
+        # The temp tables are a consistent snapshot private to this
+        # connection; later reads of them do not touch feedbacks again.
+        conn.exec_driver_sql("DROP TABLE IF EXISTS temp.rec_weights")
+        conn.exec_driver_sql("DROP TABLE IF EXISTS temp.rec_norms")
+        conn.exec_driver_sql(_WEIGHTS.format(max_books=int(MAX_READER_BOOKS)))
+        conn.exec_driver_sql(
+            "CREATE INDEX temp.ix_rec_weights_user ON rec_weights (user_id, book_id)"
+        )
+        conn.exec_driver_sql(_NORMS)
+        conn.commit()
+        books = [
+            row[0]
+            for row in conn.exec_driver_sql(
+                "SELECT book_id FROM rec_norms ORDER BY book_id"
+            )
+        ]
+        # Contiguous id ranges covering every id, so each chunk also clears
+        # the old lists of books that no longer have any neighbour.
+        bounds = [0] + books[CHUNK_BOOKS::CHUNK_BOOKS] + [2**62]
+        written = 0
+        for lo, hi in zip(bounds, bounds[1:]):
+            rows = conn.exec_driver_sql(
+                _PAIRS,
+                {"lo": lo, "hi": hi, "k": TOP_K, "shrink": SHRINKAGE},
+            ).all()
+            conn.commit()
+            neighbours = _neighbours(rows)
+            with engine.begin() as write:
+                write.execute(
+                    BookNeighbour.__table__.delete().where(
+                        BookNeighbour.book_id >= lo, BookNeighbour.book_id < hi
+                    )
+                )
+                if neighbours:
+                    write.execute(insert(BookNeighbour), neighbours)
+            written += len(neighbours)
+        conn.exec_driver_sql("DROP TABLE temp.rec_weights")
+        conn.exec_driver_sql("DROP TABLE temp.rec_norms")
+        conn.commit()
+    put_setting(engine, _FINGERPRINT_SETTING, fingerprint)
+    logger.info(
+        "Recommendations rebuilt: %d neighbours for %d books in %.1fs",
+        written,
+        len(books),
+        time.perf_counter() - started,
+    )
+    return True
+
+
+# ── Queries ───────────────────────────────────────────────────────────────────
+
+
+def similar_books(
+    db: Session, book_id: int, limit: int = TOP_K
+) -> list[tuple[Book, float]]:
+    """The stored neighbours of a book with their scores, best first: one
+    primary-key range read, however large the catalogue."""
+    rows = (
+        db.query(Book, BookNeighbour.score)
+        .join(BookNeighbour, BookNeighbour.neighbour_id == Book.id)
+        .filter(BookNeighbour.book_id == book_id)
+        .order_by(BookNeighbour.rank)
+        .limit(limit)
+        .all()
+    )
+    return [(book, score) for book, score in rows]
+
+
+def main() -> None:
+    from .database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    build(engine, force=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+from fastapi import APIRouter, Depends
+
+from ..auth import Principal, require_admin
+from ..cache import cache_stats
+from ..metrics import TimedRoute
+
+router = APIRouter(prefix="/api/admin", tags=["admin"], route_class=TimedRoute)
+
+
+@router.get("/caches")
+async def get_cache_stats(_: Principal = Depends(require_admin)):
+    """Size, hit rate, eviction and expiry counters for each in-process cache."""
+    return cache_stats()
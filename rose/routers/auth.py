@@ -1,19 +1,20 @@
 from fastapi import APIRouter, Depends, Form, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
 from ..auth import get_current_user, verify_password
-from ..database import get_db
+from ..database import DbSession, get_db, run
 from ..models import User
+from ..templating import templates
 
 router = APIRouter(tags=["auth"])
-templates = Jinja2Templates(directory="templates")
 
 
 @router.get("/login", response_class=HTMLResponse)
-def login_page(request: Request, next: str = "/", db: Session = Depends(get_db)):
-    if get_current_user(request, db):
+async def login_page(
+    request: Request, next: str = "/", db: DbSession = Depends(get_db)
+):
+    if await get_current_user(request, db):
         return RedirectResponse(url="/", status_code=302)
     return templates.TemplateResponse(
         request, "login.html", {"current_user": None, "next": next}
@@ -21,14 +22,17 @@ def login_page(request: Request, next: str = "/", db: Session = Depends(get_db))
 
 
 @router.post("/login")
-def login_submit(
+async def login_submit(
     request: Request,
     email: str = Form(...),
     password: str = Form(...),
     next: str = Form(default="/"),
-    db: Session = Depends(get_db),
+    db: DbSession = Depends(get_db),
 ):
-    user = db.query(User).filter(User.email == email).first()
+    def find(db: Session) -> User | None:
+        return db.query(User).filter(User.email == email).first()
+
+    user = await run(db, find)
     if not user or not verify_password(password, user.password):
         return templates.TemplateResponse(
             request,
@@ -44,6 +48,6 @@ def login_submit(
 
 
 @router.get("/logout")
-def logout(request: Request):
+async def logout(request: Request):
     request.session.clear()
     return RedirectResponse(url="/login", status_code=302)
@@ -1,61 +1,207 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import HTMLResponse
+from sqlalchemy import delete as sql_delete
 from sqlalchemy.orm import Session
 
-from ..auth import require_login
-from ..database import get_db
-from ..models import Book, User
-from ..schemas import BookCreate, BookOut, BookUpdate
+from .. import events, fields, queries, recommendations, writes
+from ..auth import Principal, require_login
+from ..cache import bump
+from ..conditional import conditional
+from ..database import DbSession, get_db, run
+from ..metrics import TimedRoute
+from ..models import Book
+from ..pagination import PageParams, page_params
+from ..schemas import BookCreate, BookOut, BookUpdate, BulkDeleteOut, SimilarBook
+from ..templating import fragment, is_htmx
+
+router = APIRouter(prefix="/api/books", tags=["books"], route_class=TimedRoute)
 
-router = APIRouter(prefix="/api/books", tags=["books"])
+BULK_DELETE_LIMIT = 1000
 
 
 @router.get("/", response_model=list[BookOut])
-def list_books(db: Session = Depends(get_db)):
-    return db.query(Book).order_by(Book.title).all()
+async def list_books(
+    response: Response,
+    sort: Literal["title", "rating"] = "title",
+    page: PageParams = Depends(page_params),
+    sparse: fields.Sparse | None = Depends(fields.sparse_params("books")),
+    db: DbSession = Depends(get_db),
+    _conditional: None = Depends(conditional("books")),
+):
+    """Books by title, or with `sort=rating` by average rating, best first
+    (unrated books last). See rose/fields.py for `fields`."""
+    options = ()
+    if sparse is not None:
+        keys = queries.BOOK_RATING_ORDER if sort == "rating" else queries.BOOK_ORDER
+        options = (fields.columns(sparse, keys),)
+    result = await run(db, queries.list_books, page, sort, options)
+    if result.next_cursor:
+        response.headers["X-Next-Cursor"] = result.next_cursor
+    if sparse is not None:
+        return fields.render(sparse, result.items, response)
+    return result.items
 
 
 @router.get("/{book_id}", response_model=BookOut)
-def get_book(book_id: int, db: Session = Depends(get_db)):
-    book = db.get(Book, book_id)
+async def get_book(
+    book_id: int,
+    response: Response,
+    sparse: fields.Sparse | None = Depends(fields.sparse_params("books")),
+    db: DbSession = Depends(get_db),
+    _conditional: None = Depends(conditional("books")),
+):
+    options = [fields.columns(sparse)] if sparse is not None else None
+    book = await run(db, Session.get, Book, book_id, options=options)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
+    if sparse is not None:
+        return fields.render(sparse, book, response)
     return book
 
 
+@router.get("/{book_id}/similar", response_model=list[SimilarBook])
+async def similar_books(
+    book_id: int,
+    limit: int = Query(default=recommendations.TOP_K, ge=1, le=recommendations.TOP_K),
+    db: DbSession = Depends(get_db),
+    _conditional: None = Depends(conditional("books", "recommendations")),
+):
+    """Books most liked by readers of this one, best match first."""
+
+    def load(db: Session):
+        if not db.get(Book, book_id):
+            raise HTTPException(status_code=404, detail="Book not found")
+        return recommendations.similar_books(db, book_id, limit)
+
+    similar = await run(db, load)
+    return [
+        SimilarBook(**BookOut.model_validate(book).model_dump(), score=score)
+        for book, score in similar
+    ]
+
+
 @router.post("/", response_model=BookOut, status_code=201)
-def create_book(
-    data: BookCreate, db: Session = Depends(get_db), _: User = Depends(require_login)
+async def create_book(
+    request: Request,
+    data: BookCreate,
+    principal: Principal = Depends(require_login),
 ):
-    book = Book(**data.model_dump())
-    db.add(book)
-    db.commit()
-    db.refresh(book)
+    """Create a book. htmx requests get its card, for the book list, and
+    remove the "No books found." placeholder out of band."""
+
+    def create(db: Session) -> Book:
+        book = Book(**data.model_dump())
+        db.add(book)
+        db.flush()
+        db.refresh(book)
+        return book
+
+    book = await writes.submit(create)
+    bump("books")
+    events.book_changed(request, book.id, book, created=True)
+    if is_htmx(request):
+        return fragment(
+            request,
+            "partials/book_created.html",
+            {"books": [book], "current_user": principal},
+            status_code=201,
+        )
     return book
 
 
 @router.put("/{book_id}", response_model=BookOut)
-def update_book(
+async def update_book(
+    request: Request,
     book_id: int,
     data: BookUpdate,
-    db: Session = Depends(get_db),
-    _: User = Depends(require_login),
+    principal: Principal = Depends(require_login),
 ):
-    book = db.get(Book, book_id)
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    for field, value in data.model_dump().items():
-        setattr(book, field, value)
-    db.commit()
-    db.refresh(book)
+    """Replace a book's fields. htmx requests get the book page header."""
+
+    def update(db: Session) -> Book:
+        book = db.get(Book, book_id)
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        for field, value in data.model_dump().items():
+            setattr(book, field, value)
+        db.flush()
+        db.refresh(book)
+        return book
+
+    book = await writes.submit(update)
+    bump("books")
+    events.book_changed(request, book.id, book)
+    if is_htmx(request):
+        return fragment(
+            request,
+            "partials/book_header.html",
+            {"book": book, "current_user": principal},
+        )
     return book
 
 
 @router.delete("/{book_id}", status_code=204)
-def delete_book(
-    book_id: int, db: Session = Depends(get_db), _: User = Depends(require_login)
+async def delete_book(
+    request: Request,
+    book_id: int,
+    _: Principal = Depends(require_login),
 ):
-    book = db.get(Book, book_id)
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    db.delete(book)
-    db.commit()
+    """Delete a book. htmx requests get an empty 200, which swaps the card
+    out (htmx leaves the page alone on a 204)."""
+
+    def delete(db: Session) -> None:
+        book = db.get(Book, book_id)
+        if not book:
+            raise HTTPException(status_code=404, detail="Book not found")
+        db.delete(book)
+
+    await writes.submit(delete)
+    bump("books", "feedbacks")
+    events.book_changed(request, book_id)
+    if is_htmx(request):
+        return HTMLResponse("")
+
+
+def _book_ids(ids: list[str] = Query(default=[])) -> list[int]:
+    """Dependency: read ?ids= given repeated (ids=1&ids=2), comma-separated
+    (ids=1,2) or both."""
+    try:
+        parsed = [int(part) for value in ids for part in value.split(",") if part]
+    except ValueError:
+        parsed = []
+    if not parsed or len(parsed) > BULK_DELETE_LIMIT:
+        raise HTTPException(
+            status_code=422,
+            detail=(
+                f"ids must be 1 to {BULK_DELETE_LIMIT} integers, given as "
+                "ids=1&ids=2 or ids=1,2"
+            ),
+        )
+    return parsed
+
+
+@router.delete("/", response_model=BulkDeleteOut)
+async def delete_books(
+    request: Request,
+    ids: list[int] = Depends(_book_ids),
+    _: Principal = Depends(require_login),
+):
+    """Delete every book in `ids` (repeated or comma-separated) with one
+    statement. Their feedbacks are removed by the database's ON DELETE
+    CASCADE; ids that do not exist are ignored."""
+
+    def delete(db: Session) -> list[int]:
+        result = db.execute(
+            sql_delete(Book).where(Book.id.in_(ids)).returning(Book.id),
+            execution_options={"synchronize_session": False},
+        )
+        return list(result.scalars())
+
+    deleted = await writes.submit(delete)
+    if deleted:
+        bump("books", "feedbacks")
+        for book_id in deleted:
+            events.book_changed(request, book_id)
+    return BulkDeleteOut(deleted=len(deleted))
@@ -0,0 +1,97 @@
+import logging
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from .. import bulk, writes
+from ..auth import Principal, require_login
+from ..cache import bump
+from ..metrics import TimedRoute
+from ..schemas import ImportResult
+
+logger = logging.getLogger("rose")
+
+router = APIRouter(prefix="/api", tags=["bulk"], route_class=TimedRoute)
+
+_IMPORTERS = {"books": bulk.import_books, "feedbacks": bulk.import_feedbacks}
+_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+@router.post("/import", response_model=ImportResult)
+async def import_rows(
+    request: Request,
+    kind: Literal["books", "feedbacks"],
+    format: Literal["ndjson", "csv"] | None = None,
+    current_user: Principal = Depends(require_login),
+):
+    """Bulk-load books or feedbacks from an NDJSON or CSV request body.
+
+    The body is read as it streams in and each batch is applied through the
+    write queue, so imports take turns with other writes instead of racing
+    them for the lock. Invalid rows, and every row of a batch that could not
+    be written, are reported by line number and do not stop the import.
+    Books are de-duplicated on (title, author). The format defaults from
+    Content-Type.
+    """
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if content_type.startswith("text/csv") else "ndjson"
+    reader = bulk.read_csv if format == "csv" else bulk.read_ndjson
+    importer = _IMPORTERS[kind]
+    created = duplicates = failed = 0
+    errors: list[bulk.RowError] = []
+
+    async def flush(rows: list) -> None:
+        nonlocal created, duplicates, failed
+        try:
+            result = await writes.submit(importer, rows, current_user.id)
+        except Exception as exc:
+            # Earlier batches have committed; report this one row by row and
+            # carry on with the rest of the body.
+            logger.warning("Import batch failed", exc_info=True)
+            error = f"Batch not imported: {exc.__class__.__name__}"
+            result = bulk.BatchResult(
+                0, 0, [bulk.RowError(lineno, error) for lineno, _ in rows], 0
+            )
+        created += result.created
+        duplicates += result.duplicates
+        failed += len(result.errors)
+        errors.extend(result.errors[: bulk.MAX_ERRORS - len(errors)])
+        if kind == "feedbacks" and result.created:
+            bump("feedbacks", "books")
+        elif result.books_created:
+            bump("books")
+
+    rows = []
+    async for row in reader(request.stream()):
+        rows.append(row)
+        if len(rows) >= bulk.IMPORT_BATCH:
+            await flush(rows)
+            rows = []
+    if rows:
+        await flush(rows)
+    return ImportResult(
+        created=created,
+        duplicates=duplicates,
+        failed=failed,
+        errors=[{"line": e.line, "error": e.error} for e in errors],
+    )
+
+
+@router.get("/export")
+async def export_rows(
+    table: Literal["books", "feedbacks", "users"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    current_user: Principal = Depends(require_login),
+):
+    """Stream a whole table as NDJSON or CSV. Users are exported for admins
+    only and never include password hashes."""
+    if table == "users" and not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    body = bulk.export_csv(table) if format == "csv" else bulk.export_ndjson(table)
+    return StreamingResponse(
+        body,
+        media_type=_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'},
+    )
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from .. import events
+from ..auth import Principal, require_login
+
+router = APIRouter(tags=["events"])
+
+
+@router.get("/events")
+async def event_stream(
+    book_id: int | None = None,
+    user_id: int | None = None,
+    client: str | None = None,
+    principal: Principal = Depends(require_login),
+):
+    """Server-Sent Events carrying htmx fragments for every change to books,
+    feedbacks and (for admins) users. With `book_id` or `user_id`, only the
+    changes shown on that book's or user's page. `client` names the page, so
+    that the changes it makes itself are not echoed back to it."""
+    subscriber = events.bus.subscribe(
+        book_id, principal.is_admin, client, user_id=user_id
+    )
+    return StreamingResponse(
+        events.stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
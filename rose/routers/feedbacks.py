@@ -1,69 +1,156 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import HTMLResponse
 from sqlalchemy.orm import Session
 
-from ..auth import require_login
-from ..database import get_db
+from .. import events, fields, queries, writes
+from ..auth import Principal, require_login
+from ..cache import bump
+from ..conditional import conditional
+from ..database import DbSession, get_db, run
+from ..metrics import TimedRoute
 from ..models import Book, Feedback, User
+from ..pagination import PageParams, page_params
 from ..schemas import FeedbackCreate, FeedbackOut, FeedbackUpdate
+from ..templating import fragment, is_htmx
 
-router = APIRouter(prefix="/api/feedbacks", tags=["feedbacks"])
+router = APIRouter(prefix="/api/feedbacks", tags=["feedbacks"], route_class=TimedRoute)
+
+
+def _changed(
+    request: Request, principal: Principal, fb: Feedback | None, book: Book
+) -> HTMLResponse:
+    """The htmx answer to a feedback write: the feedback's list item (none
+    after a delete) with the book's header and feedback count out of band.
+    A new feedback also removes the "No feedbacks yet." placeholder."""
+    created = request.method == "POST"
+    return fragment(
+        request,
+        "partials/feedback_changed.html",
+        {"fb": fb, "book": book, "created": created, "current_user": principal},
+        status_code=201 if created else 200,
+    )
 
 
 @router.get("/", response_model=list[FeedbackOut])
-def list_feedbacks(db: Session = Depends(get_db), _: User = Depends(require_login)):
-    return db.query(Feedback).order_by(Feedback.created_at.desc()).all()
+async def list_feedbacks(
+    response: Response,
+    page: PageParams = Depends(page_params),
+    sparse: fields.Sparse | None = Depends(fields.sparse_params("feedbacks")),
+    db: DbSession = Depends(get_db),
+    _: Principal = Depends(require_login),
+    _conditional: None = Depends(conditional("feedbacks", "books", "users")),
+):
+    """Newest first. See rose/fields.py for `fields` and `include`."""
+    if sparse is None:
+        result = await run(db, queries.list_feedbacks, page)
+    else:
+
+        def load(db: Session):
+            option = fields.columns(sparse, queries.FEEDBACK_ORDER)
+            result = queries.list_feedbacks(db, page, (option,))
+            return result, fields.included(db, sparse, result.items)
+
+        result, included = await run(db, load)
+    if result.next_cursor:
+        response.headers["X-Next-Cursor"] = result.next_cursor
+    if sparse is not None:
+        return fields.render(sparse, result.items, response, included)
+    return result.items
 
 
 @router.get("/{feedback_id}", response_model=FeedbackOut)
-def get_feedback(
-    feedback_id: int, db: Session = Depends(get_db), _: User = Depends(require_login)
+async def get_feedback(
+    feedback_id: int,
+    response: Response,
+    sparse: fields.Sparse | None = Depends(fields.sparse_params("feedbacks")),
+    db: DbSession = Depends(get_db),
+    _: Principal = Depends(require_login),
 ):
-    fb = db.get(Feedback, feedback_id)
+    if sparse is None:
+        fb = await run(db, queries.get_feedback, feedback_id)
+    else:
+
+        def load(db: Session):
+            fb = db.get(Feedback, feedback_id, options=[fields.columns(sparse)])
+            if fb is None:
+                return None, None
+            return fb, fields.included(db, sparse, [fb])
+
+        fb, included = await run(db, load)
     if not fb:
         raise HTTPException(status_code=404, detail="Feedback not found")
+    if sparse is not None:
+        return fields.render(sparse, fb, response, included)
     return fb
 
 
 @router.post("/", response_model=FeedbackOut, status_code=201)
-def create_feedback(
+async def create_feedback(
+    request: Request,
     data: FeedbackCreate,
-    db: Session = Depends(get_db),
-    _: User = Depends(require_login),
+    principal: Principal = Depends(require_login),
 ):
-    if not db.get(User, data.user_id):
-        raise HTTPException(status_code=404, detail="User not found")
-    if not db.get(Book, data.book_id):
-        raise HTTPException(status_code=404, detail="Book not found")
-    fb = Feedback(**data.model_dump())
-    db.add(fb)
-    db.commit()
-    db.refresh(fb)
+    def create(db: Session) -> Feedback:
+        if not db.get(User, data.user_id):
+            raise HTTPException(status_code=404, detail="User not found")
+        if not db.get(Book, data.book_id):
+            raise HTTPException(status_code=404, detail="Book not found")
+        fb = Feedback(**data.model_dump())
+        db.add(fb)
+        db.flush()
+        return queries.get_feedback(db, fb.id, reload=True)
+
+    fb = await writes.submit(create)
+    bump("feedbacks", "books")
+    events.feedback_changed(request, fb.book, fb, created=True)
+    if is_htmx(request):
+        return _changed(request, principal, fb, fb.book)
     return fb
 
 
 @router.put("/{feedback_id}", response_model=FeedbackOut)
-def update_feedback(
+async def update_feedback(
+    request: Request,
     feedback_id: int,
     data: FeedbackUpdate,
-    db: Session = Depends(get_db),
-    _: User = Depends(require_login),
+    principal: Principal = Depends(require_login),
 ):
-    fb = db.get(Feedback, feedback_id)
-    if not fb:
-        raise HTTPException(status_code=404, detail="Feedback not found")
-    for field, value in data.model_dump().items():
-        setattr(fb, field, value)
-    db.commit()
-    db.refresh(fb)
+    def update(db: Session) -> Feedback:
+        fb = queries.get_feedback(db, feedback_id)
+        if not fb:
+            raise HTTPException(status_code=404, detail="Feedback not found")
+        for field, value in data.model_dump().items():
+            setattr(fb, field, value)
+        db.flush()
+        return queries.get_feedback(db, feedback_id, reload=True)
+
+    fb = await writes.submit(update)
+    bump("feedbacks", "books")
+    events.feedback_changed(request, fb.book, fb)
+    if is_htmx(request):
+        return _changed(request, principal, fb, fb.book)
     return fb
 
 
 @router.delete("/{feedback_id}", status_code=204)
-def delete_feedback(
-    feedback_id: int, db: Session = Depends(get_db), _: User = Depends(require_login)
+async def delete_feedback(
+    request: Request,
+    feedback_id: int,
+    principal: Principal = Depends(require_login),
 ):
-    fb = db.get(Feedback, feedback_id)
-    if not fb:
-        raise HTTPException(status_code=404, detail="Feedback not found")
-    db.delete(fb)
-    db.commit()
+    def delete(db: Session) -> tuple[Book, int]:
+        fb = db.get(Feedback, feedback_id)
+        if not fb:
+            raise HTTPException(status_code=404, detail="Feedback not found")
+        book_id, user_id = fb.book_id, fb.user_id
+        db.delete(fb)
+        db.flush()
+        # Reread the counters the delete triggers just updated.
+        return db.get(Book, book_id, populate_existing=True), user_id
+
+    book, user_id = await writes.submit(delete)
+    bump("feedbacks", "books")
+    events.feedback_changed(request, book, feedback_id=feedback_id, user_id=user_id)
+    if is_htmx(request):
+        # An empty 200 rather than the 204, which htmx would not swap.
+        return _changed(request, principal, None, book)
@@ -0,0 +1,18 @@
+import secrets
+
+from fastapi import APIRouter, Request, Response
+
+from .. import metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics(request: Request):
+    """Request, SQL and rendering metrics in the Prometheus text format."""
+    if metrics.METRICS_TOKEN is not None:
+        expected = f"Bearer {metrics.METRICS_TOKEN}"
+        given = request.headers.get("authorization", "")
+        if not secrets.compare_digest(given.encode(), expected.encode()):
+            return Response(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    return Response(metrics.registry.expose(), media_type=metrics.CONTENT_TYPE)
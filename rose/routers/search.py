@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.orm import Session
+
+from .. import search
+from ..auth import get_current_user
+from ..database import DbSession, get_db, run
+from ..metrics import TimedRoute
+from ..schemas import BookHit, FeedbackHit, SearchResults, UserHit
+
+router = APIRouter(prefix="/api/search", tags=["search"], route_class=TimedRoute)
+
+
+def _hit(schema, hit: search.Hit):
+    data = {f"{k}_html": str(v) for k, v in hit.highlights.items()}
+    for name in schema.model_fields:
+        data.setdefault(name, getattr(hit.obj, name, None))
+    return schema.model_validate(data)
+
+
+@router.get("/", response_model=SearchResults)
+async def search_all(
+    request: Request,
+    q: str,
+    limit: int = Query(default=20, ge=1, le=search.SEARCH_LIMIT),
+    db: DbSession = Depends(get_db),
+):
+    """Ranked full-text search. Reviews need a login and users need an admin,
+    matching the access rules of the corresponding list endpoints."""
+    current_user = await get_current_user(request, db)
+
+    def find(db: Session):
+        books = search.search_books(db, q, limit)
+        users, feedbacks = [], []
+        if current_user:
+            feedbacks = search.search_feedbacks(db, q, limit)
+            if current_user.is_admin:
+                users = search.search_users(db, q, limit)
+        return books, users, feedbacks
+
+    books, users, feedbacks = await run(db, find)
+    return SearchResults(
+        books=[_hit(BookHit, h) for h in books],
+        users=[_hit(UserHit, h) for h in users],
+        feedbacks=[_hit(FeedbackHit, h) for h in feedbacks],
+    )
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from .. import stats
+from ..auth import Principal, require_login
+from ..conditional import conditional
+from ..database import DbSession, get_db, run
+from ..metrics import TimedRoute
+from ..schemas import ReadingStats
+
+router = APIRouter(tags=["stats"], route_class=TimedRoute)
+
+_TABLES = ("feedbacks", "books", "users")
+
+
+@router.get("/api/stats", response_model=ReadingStats)
+async def site_stats(
+    db: DbSession = Depends(get_db),
+    _conditional: None = Depends(conditional(*_TABLES)),
+):
+    """Reading statistics across every reader."""
+    return await run(db, stats.reading_stats)
+
+
+@router.get("/api/users/{user_id}/stats", response_model=ReadingStats)
+async def user_stats(
+    user_id: int,
+    db: DbSession = Depends(get_db),
+    current_user: Principal = Depends(require_login),
+    _conditional: None = Depends(conditional(*_TABLES)),
+):
+    """Books and pages per year, rating distribution and most-read authors.
+    Readers see their own; admins see anyone's."""
+    if not current_user.is_admin and current_user.id != user_id:
+        raise HTTPException(status_code=403, detail="Not allowed")
+    return await run(db, stats.reading_stats, user_id)
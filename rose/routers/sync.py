@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from .. import sync
+from ..auth import Principal, require_login
+from ..database import DbSession, get_db, run
+from ..metrics import TimedRoute
+from ..schemas import SyncOut
+
+router = APIRouter(prefix="/api/sync", tags=["sync"], route_class=TimedRoute)
+
+
+@router.get("/", response_model=SyncOut)
+async def get_changes(
+    since: str | None = None,
+    limit: int = Query(default=sync.SYNC_LIMIT, ge=1, le=sync.SYNC_LIMIT),
+    db: DbSession = Depends(get_db),
+    current_user: Principal = Depends(require_login),
+):
+    """Everything created, updated or deleted since the `since` cursor.
+
+    Start without `since` for a full download, then pass back the returned
+    `cursor`. While `has_more` is true, call again straight away. Users and
+    their deletions are only included for admins, matching /api/users/.
+    """
+
+    def load(db: Session) -> sync.Changes:
+        return sync.changes_since(db, since, limit, current_user.is_admin)
+
+    return await run(db, load)
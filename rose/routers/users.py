@@ -1,97 +1,145 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from ..auth import hash_password, require_admin, require_login
-from ..database import get_db
+from .. import events, fields, queries, writes
+from ..auth import (
+    Principal,
+    hash_password,
+    invalidate_principal,
+    require_admin,
+    require_login,
+)
+from ..cache import bump
+from ..conditional import conditional
+from ..database import DbSession, get_db, run
+from ..metrics import TimedRoute
 from ..models import User
+from ..pagination import PageParams, page_params
 from ..schemas import UserCreate, UserOut, UserUpdate
 
-router = APIRouter(prefix="/api/users", tags=["users"])
+router = APIRouter(prefix="/api/users", tags=["users"], route_class=TimedRoute)
 
 
 @router.get("/", response_model=list[UserOut])
-def list_users(
-    db: Session = Depends(get_db),
-    _: User = Depends(require_admin),
+async def list_users(
+    response: Response,
+    page: PageParams = Depends(page_params),
+    sparse: fields.Sparse | None = Depends(fields.sparse_params("users")),
+    db: DbSession = Depends(get_db),
+    _: Principal = Depends(require_admin),
+    _conditional: None = Depends(conditional("users")),
 ):
-    return db.query(User).order_by(User.surname, User.name).all()
+    """See rose/fields.py for `fields`."""
+    options = ()
+    if sparse is not None:
+        options = (fields.columns(sparse, queries.USER_ORDER),)
+    result = await run(db, queries.list_users, page, options)
+    if result.next_cursor:
+        response.headers["X-Next-Cursor"] = result.next_cursor
+    if sparse is not None:
+        return fields.render(sparse, result.items, response)
+    return result.items
 
 
 @router.get("/me", response_model=UserOut)
-def get_me(current_user: User = Depends(require_login)):
+async def get_me(current_user: Principal = Depends(require_login)):
     return current_user
 
 
 @router.get("/{user_id}", response_model=UserOut)
-def get_user(
+async def get_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    _: User = Depends(require_login),
+    response: Response,
+    sparse: fields.Sparse | None = Depends(fields.sparse_params("users")),
+    db: DbSession = Depends(get_db),
+    _: Principal = Depends(require_login),
 ):
-    user = db.get(User, user_id)
+    options = [fields.columns(sparse)] if sparse is not None else None
+    user = await run(db, Session.get, User, user_id, options=options)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    if sparse is not None:
+        return fields.render(sparse, user, response)
     return user
 
 
 @router.post("/", response_model=UserOut, status_code=201)
-def create_user(
+async def create_user(
+    request: Request,
     data: UserCreate,
-    db: Session = Depends(get_db),
-    _: User = Depends(require_admin),
+    _: Principal = Depends(require_admin),
 ):
-    user = User(
-        name=data.name,
-        surname=data.surname,
-        email=data.email,
-        password=hash_password(data.password),
-        is_admin=data.is_admin,
-    )
-    db.add(user)
-    try:
-        db.commit()
-    except IntegrityError:
-        db.rollback()
-        raise HTTPException(status_code=409, detail="Email already registered")
-    db.refresh(user)
+    password = hash_password(data.password)
+
+    def create(db: Session) -> User:
+        user = User(
+            name=data.name,
+            surname=data.surname,
+            email=data.email,
+            password=password,
+            is_admin=data.is_admin,
+        )
+        db.add(user)
+        try:
+            db.flush()
+        except IntegrityError:
+            raise HTTPException(status_code=409, detail="Email already registered")
+        db.refresh(user)
+        return user
+
+    user = await writes.submit(create)
+    bump("users")
+    events.user_changed(request, user.id, user, created=True)
     return user
 
 
 @router.put("/{user_id}", response_model=UserOut)
-def update_user(
+async def update_user(
+    request: Request,
     user_id: int,
     data: UserUpdate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_login),
+    current_user: Principal = Depends(require_login),
 ):
-    user = db.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    if not current_user.is_admin and current_user.id != user_id:
-        raise HTTPException(status_code=403, detail="Not allowed")
-    user.name = data.name
-    user.surname = data.surname
-    user.email = data.email
-    try:
-        db.commit()
-    except IntegrityError:
-        db.rollback()
-        raise HTTPException(status_code=409, detail="Email already registered")
-    db.refresh(user)
+    def update(db: Session) -> User:
+        user = db.get(User, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        if not current_user.is_admin and current_user.id != user_id:
+            raise HTTPException(status_code=403, detail="Not allowed")
+        user.name = data.name
+        user.surname = data.surname
+        user.email = data.email
+        try:
+            db.flush()
+        except IntegrityError:
+            raise HTTPException(status_code=409, detail="Email already registered")
+        db.refresh(user)
+        return user
+
+    user = await writes.submit(update)
+    bump("users")
+    events.user_changed(request, user_id, user)
+    invalidate_principal(user_id)
     return user
 
 
 @router.delete("/{user_id}", status_code=204)
-def delete_user(
+async def delete_user(
+    request: Request,
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(require_admin),
+    current_user: Principal = Depends(require_admin),
 ):
     if user_id == current_user.id:
         raise HTTPException(status_code=400, detail="Cannot delete your own account")
-    user = db.get(User, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    db.delete(user)
-    db.commit()
+
+    def delete(db: Session) -> None:
+        user = db.get(User, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        db.delete(user)
+
+    await writes.submit(delete)
+    bump("users", "feedbacks", "books")
+    invalidate_principal(user_id)
+    events.user_changed(request, user_id)
@@ -1,20 +1,44 @@
+import os
+
 from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse, RedirectResponse, Response
-from fastapi.templating import Jinja2Templates
 from sqlalchemy.orm import Session
 
+from .. import queries, recommendations, search, stats
 from ..auth import get_current_user
-from ..database import get_db
-from ..models import Book, Feedback, User
+from ..cache import PageCache, stamp
+from ..database import DbSession, get_db, run
+from ..models import Book, User
+from ..pagination import PageParams, page_params
+from ..templating import templates
 
 router = APIRouter(tags=["views"])
-templates = Jinja2Templates(directory="templates")
+
+HOME_PAGE_SIZE = 12
+
+# Anonymous pages are the same for every visitor, so they are cached whole and
+# served without touching the database until a write bumps a table they
+# depend on.
+page_cache = PageCache(
+    "pages", maxbytes=int(os.environ.get("PAGE_CACHE_BYTES", 32 * 1024 * 1024))
+)
 
 
 def _login_redirect(path: str) -> RedirectResponse:
     return RedirectResponse(url=f"/login?next={path}", status_code=302)
 
 
+def _anonymous(request: Request) -> bool:
+    return not request.session.get("user_id")
+
+
+def _cached(request: Request, key: tuple) -> Response | None:
+    if not _anonymous(request):
+        return None
+    body = page_cache.get(key)
+    return HTMLResponse(body) if body is not None else None
+
+
 def _htmx_login_redirect() -> Response:
     """For htmx partial requests: signal the browser to redirect to login."""
     r = Response(status_code=401)
@@ -26,147 +50,310 @@ def _htmx_login_redirect() -> Response:
 
 
 @router.get("/", response_class=HTMLResponse)
-def index(request: Request, db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
-    books = db.query(Book).order_by(Book.title).all()
-    return templates.TemplateResponse(
-        request, "index.html", {"books": books, "current_user": current_user}
+async def index(request: Request, db: DbSession = Depends(get_db)):
+    key, tables = ("index",), ("books",)
+    if cached := _cached(request, key):
+        return cached
+    version = stamp(tables)
+    current_user = await get_current_user(request, db)
+    page = await run(db, queries.list_books, PageParams(limit=HOME_PAGE_SIZE))
+    response = templates.TemplateResponse(
+        request,
+        "index.html",
+        {
+            "books": page.items,
+            "has_more": page.next_cursor is not None,
+            "current_user": current_user,
+        },
     )
+    if current_user is None:
+        page_cache.set(key, tables, version, response.body)
+    return response
 
 
 @router.get("/books", response_class=HTMLResponse)
-def books_page(request: Request, db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
+async def books_page(request: Request, db: DbSession = Depends(get_db)):
+    current_user = await get_current_user(request, db)
     if not current_user:
         return _login_redirect("/books")
-    books = db.query(Book).order_by(Book.title).all()
+    page = await run(db, queries.list_books, PageParams())
     return templates.TemplateResponse(
-        request, "books.html", {"books": books, "current_user": current_user}
+        request,
+        "books.html",
+        {
+            "books": page.items,
+            "next_cursor": page.next_cursor,
+            "current_user": current_user,
+        },
     )
 
 
 @router.get("/books/{book_id}", response_class=HTMLResponse)
-def book_detail(request: Request, book_id: int, db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
-    book = db.get(Book, book_id)
+async def book_detail(request: Request, book_id: int, db: DbSession = Depends(get_db)):
+    key = ("book_detail", book_id)
+    tables = ("books", "feedbacks", "users", "recommendations")
+    if cached := _cached(request, key):
+        return cached
+    version = stamp(tables)
+    current_user = await get_current_user(request, db)
+
+    def load(db: Session):
+        book = db.get(Book, book_id)
+        if not book:
+            return None, None, []
+        feedbacks = queries.list_book_feedbacks(db, book_id, PageParams())
+        similar = recommendations.similar_books(db, book_id)
+        return book, feedbacks, similar
+
+    book, feedbacks, similar = await run(db, load)
     if not book:
         return templates.TemplateResponse(
             request, "404.html", {"current_user": current_user}, status_code=404
         )
-    feedbacks = (
-        db.query(Feedback)
-        .filter(Feedback.book_id == book_id)
-        .order_by(Feedback.created_at.desc())
-        .all()
-    )
-    users = db.query(User).order_by(User.surname, User.name).all()
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         request,
         "book_detail.html",
         {
             "book": book,
-            "feedbacks": feedbacks,
-            "users": users,
+            "feedbacks": feedbacks.items,
+            "next_cursor": feedbacks.next_cursor,
+            "similar": similar,
             "current_user": current_user,
         },
     )
+    if current_user is None:
+        page_cache.set(key, tables, version, response.body)
+    return response
 
 
 @router.get("/users", response_class=HTMLResponse)
-def users_page(request: Request, db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
+async def users_page(request: Request, db: DbSession = Depends(get_db)):
+    current_user = await get_current_user(request, db)
     if not current_user:
         return _login_redirect("/users")
     if not current_user.is_admin:
         # Non-admins are redirected to their own profile
         return RedirectResponse(url=f"/users/{current_user.id}", status_code=302)
-    users = db.query(User).order_by(User.surname, User.name).all()
+    page = await run(db, queries.list_users, PageParams())
     return templates.TemplateResponse(
-        request, "users.html", {"users": users, "current_user": current_user}
+        request,
+        "users.html",
+        {
+            "users": page.items,
+            "next_cursor": page.next_cursor,
+            "current_user": current_user,
+        },
     )
 
 
 @router.get("/users/{user_id}", response_class=HTMLResponse)
-def user_detail(request: Request, user_id: int, db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
+async def user_detail(request: Request, user_id: int, db: DbSession = Depends(get_db)):
+    current_user = await get_current_user(request, db)
     if not current_user:
         return _login_redirect(f"/users/{user_id}")
     # Non-admins can only view their own profile
     if not current_user.is_admin and current_user.id != user_id:
         return RedirectResponse(url=f"/users/{current_user.id}", status_code=302)
-    user = db.get(User, user_id)
+
+    def load(db: Session):
+        user = db.get(User, user_id)
+        if not user:
+            return None, None, None
+        feedbacks = queries.list_user_feedbacks(db, user_id, PageParams())
+        return user, feedbacks, stats.reading_stats(db, user_id)
+
+    user, feedbacks, reading = await run(db, load)
     if not user:
         return templates.TemplateResponse(
             request, "404.html", {"current_user": current_user}, status_code=404
         )
-    feedbacks = (
-        db.query(Feedback)
-        .filter(Feedback.user_id == user_id)
-        .order_by(Feedback.created_at.desc())
-        .all()
-    )
     return templates.TemplateResponse(
         request,
         "user_detail.html",
-        {"user": user, "feedbacks": feedbacks, "current_user": current_user},
+        {
+            "user": user,
+            "feedbacks": feedbacks.items,
+            "next_cursor": feedbacks.next_cursor,
+            "stats": reading,
+            "current_user": current_user,
+        },
     )
 
 
 @router.get("/profile", response_class=HTMLResponse)
-def own_profile(request: Request, db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
+async def own_profile(request: Request, db: DbSession = Depends(get_db)):
+    current_user = await get_current_user(request, db)
     if not current_user:
         return _login_redirect("/profile")
     return RedirectResponse(url=f"/users/{current_user.id}", status_code=302)
 
 
 @router.get("/feedbacks", response_class=HTMLResponse)
-def feedbacks_page(request: Request, db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
+async def feedbacks_page(request: Request, db: DbSession = Depends(get_db)):
+    current_user = await get_current_user(request, db)
     if not current_user:
         return _login_redirect("/feedbacks")
-    feedbacks = db.query(Feedback).order_by(Feedback.created_at.desc()).all()
+    page = await run(db, queries.list_feedbacks, PageParams())
     return templates.TemplateResponse(
         request,
         "feedbacks.html",
-        {"feedbacks": feedbacks, "current_user": current_user},
+        {
+            "feedbacks": page.items,
+            "next_cursor": page.next_cursor,
+            "current_user": current_user,
+        },
     )
 
 
 # ── HTMX partials ─────────────────────────────────────────────────────────────
+# Each partial renders one page of results. When more rows exist it appends a
+# "load more" sentinel that fetches the next page once it scrolls into view.
+# A search query instead returns the best-ranked matches with highlights.
 
 
 @router.get("/partials/books", response_class=HTMLResponse)
-def partial_books(request: Request, q: str = "", db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
-    query = db.query(Book)
+async def partial_books(
+    request: Request,
+    q: str = "",
+    page: PageParams = Depends(page_params),
+    db: DbSession = Depends(get_db),
+):
+    current_user = await get_current_user(request, db)
     if q:
-        like = f"%{q}%"
-        query = query.filter(Book.title.ilike(like) | Book.author.ilike(like))
-    books = query.order_by(Book.title).all()
+        hits = await run(db, search.search_books, q)
+        return templates.TemplateResponse(
+            request,
+            "partials/book_list.html",
+            {
+                "books": [h.obj for h in hits],
+                "highlights": {h.obj.id: h.highlights for h in hits},
+                "current_user": current_user,
+            },
+        )
+    result = await run(db, queries.list_books, page)
     return templates.TemplateResponse(
         request,
         "partials/book_list.html",
-        {"books": books, "current_user": current_user},
+        {
+            "books": result.items,
+            "next_cursor": result.next_cursor,
+            "current_user": current_user,
+        },
+    )
+
+
+@router.get("/partials/books/{book_id}/feedbacks", response_class=HTMLResponse)
+async def partial_book_feedbacks(
+    request: Request,
+    book_id: int,
+    page: PageParams = Depends(page_params),
+    db: DbSession = Depends(get_db),
+):
+    current_user = await get_current_user(request, db)
+    result = await run(db, queries.list_book_feedbacks, book_id, page)
+    return templates.TemplateResponse(
+        request,
+        "partials/book_feedbacks.html",
+        {
+            "book_id": book_id,
+            "feedbacks": result.items,
+            "next_cursor": result.next_cursor,
+            "current_user": current_user,
+        },
+    )
+
+
+@router.get("/partials/user-options", response_class=HTMLResponse)
+async def partial_user_options(
+    request: Request, q: str = "", db: DbSession = Depends(get_db)
+):
+    """The <option>s of the feedback form's user picker: the best few prefix
+    matches for `q`, or just the signed-in user when `q` is empty."""
+    current_user = await get_current_user(request, db)
+    if not current_user:
+        return _htmx_login_redirect()
+    users = await run(db, search.pick_users, q) if q.strip() else [current_user]
+    return templates.TemplateResponse(
+        request, "partials/user_options.html", {"users": users}
     )
 
 
 @router.get("/partials/users", response_class=HTMLResponse)
-def partial_users(request: Request, q: str = "", db: Session = Depends(get_db)):
-    current_user = get_current_user(request, db)
+async def partial_users(
+    request: Request,
+    q: str = "",
+    page: PageParams = Depends(page_params),
+    db: DbSession = Depends(get_db),
+):
+    current_user = await get_current_user(request, db)
     if not current_user:
         return _htmx_login_redirect()
     if not current_user.is_admin:
         return Response(status_code=403)
-    query = db.query(User)
     if q:
-        like = f"%{q}%"
-        query = query.filter(
-            User.name.ilike(like) | User.surname.ilike(like) | User.email.ilike(like)
+        hits = await run(db, search.search_users, q)
+        return templates.TemplateResponse(
+            request,
+            "partials/user_list.html",
+            {
+                "users": [h.obj for h in hits],
+                "highlights": {h.obj.id: h.highlights for h in hits},
+                "current_user": current_user,
+            },
         )
-    users = query.order_by(User.surname, User.name).all()
+    result = await run(db, queries.list_users, page)
     return templates.TemplateResponse(
         request,
         "partials/user_list.html",
-        {"users": users, "current_user": current_user},
+        {
+            "users": result.items,
+            "next_cursor": result.next_cursor,
+            "current_user": current_user,
+        },
+    )
+
+
+@router.get("/partials/users/{user_id}/feedbacks", response_class=HTMLResponse)
+async def partial_user_feedbacks(
+    request: Request,
+    user_id: int,
+    page: PageParams = Depends(page_params),
+    db: DbSession = Depends(get_db),
+):
+    current_user = await get_current_user(request, db)
+    if not current_user:
+        return _htmx_login_redirect()
+    if not current_user.is_admin and current_user.id != user_id:
+        return Response(status_code=403)
+    result = await run(db, queries.list_user_feedbacks, user_id, page)
+    return templates.TemplateResponse(
+        request,
+        "partials/user_feedbacks.html",
+        {
+            "user_id": user_id,
+            "feedbacks": result.items,
+            "next_cursor": result.next_cursor,
+            "current_user": current_user,
+        },
+    )
+
+
+@router.get("/partials/feedbacks", response_class=HTMLResponse)
+async def partial_feedbacks(
+    request: Request,
+    page: PageParams = Depends(page_params),
+    db: DbSession = Depends(get_db),
+):
+    current_user = await get_current_user(request, db)
+    if not current_user:
+        return _htmx_login_redirect()
+    result = await run(db, queries.list_feedbacks, page)
+    return templates.TemplateResponse(
+        request,
+        "partials/feedback_list.html",
+        {
+            "feedbacks": result.items,
+            "next_cursor": result.next_cursor,
+            "current_user": current_user,
+        },
     )
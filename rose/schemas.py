@@ -1,3 +1,5 @@
+from datetime import datetime
+
 from pydantic import BaseModel, EmailStr, field_validator
 
 # ── User ──────────────────────────────────────────────────────────────────────
@@ -39,6 +41,7 @@ class UserOut(BaseModel):
     surname: str
     email: str
     is_admin: bool
+    updated_at: datetime | None = None
 
     model_config = {"from_attributes": True}
 
@@ -71,10 +74,23 @@ class BookOut(BaseModel):
     author: str
     publishing_year: int | None
     number_of_pages: int | None
+    updated_at: datetime | None = None
+    feedback_count: int = 0
+    rating_count: int = 0
+    rating_avg: float | None = None
+    rating_histogram: list[int] | None = None
 
     model_config = {"from_attributes": True}
 
 
+class SimilarBook(BookOut):
+    score: float
+
+
+class BulkDeleteOut(BaseModel):
+    deleted: int
+
+
 # ── Feedback ──────────────────────────────────────────────────────────────────
 
 
@@ -113,7 +129,91 @@ class FeedbackOut(BaseModel):
     rating: float | None
     review: str | None
     year_of_reading: int | None
+    updated_at: datetime | None = None
     user: UserOut
     book: BookOut
 
     model_config = {"from_attributes": True}
+
+
+# ── Stats ─────────────────────────────────────────────────────────────────────
+
+
+class YearStats(BaseModel):
+    year: int
+    books: int
+    pages: int
+
+    model_config = {"from_attributes": True}
+
+
+class AuthorStats(BaseModel):
+    author: str
+    books: int
+
+    model_config = {"from_attributes": True}
+
+
+class ReadingStats(BaseModel):
+    books_read: int
+    years: list[YearStats]
+    rating_histogram: list[int]
+    top_authors: list[AuthorStats]
+
+    model_config = {"from_attributes": True}
+
+
+# ── Search ────────────────────────────────────────────────────────────────────
+# Highlighted fields are HTML-escaped text with matches wrapped in <mark>.
+
+
+class BookHit(BookOut):
+    title_html: str
+    author_html: str
+
+
+class UserHit(UserOut):
+    name_html: str
+    surname_html: str
+    email_html: str
+
+
+class FeedbackHit(BaseModel):
+    id: int
+    user_id: int
+    book_id: int
+    rating: float | None
+    review_html: str
+
+
+class SearchResults(BaseModel):
+    books: list[BookHit]
+    users: list[UserHit]
+    feedbacks: list[FeedbackHit]
+
+
+# ── Sync ──────────────────────────────────────────────────────────────────────
+
+
+class SyncOut(BaseModel):
+    books: list[BookOut]
+    feedbacks: list[FeedbackOut]
+    users: list[UserOut]
+    deleted: dict[str, list[int]]
+    cursor: str
+    has_more: bool
+
+
+# ── Bulk import ───────────────────────────────────────────────────────────────
+
+
+class ImportRowError(BaseModel):
+    line: int
+    error: str
+
+
+class ImportResult(BaseModel):
+    created: int
+    duplicates: int
+    failed: int
+    errors: list[ImportRowError]
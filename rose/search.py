@@ -0,0 +1,228 @@
+import logging
+import re
+from typing import NamedTuple
+
+from markupsafe import Markup, escape
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from .models import Book, Feedback, User
+
+logger = logging.getLogger("rose")
+
+SEARCH_LIMIT = 50
+# Matches offered by the typeahead user picker.
+PICKER_LIMIT = 10
+
+# Set by create_search_index(); stays False on SQLite builds without FTS5, in
+# which case every search falls back to the LIKE scan.
+fts_enabled = False
+
+# ── Index ─────────────────────────────────────────────────────────────────────
+# Each searchable table gets an external-content FTS5 table that stores only
+# the inverted index; the text itself stays in the base table. Triggers keep
+# the index in step with every INSERT/UPDATE/DELETE, whichever code path
+# issues it. The UPDATE triggers fire only when an indexed column changes.
+
+_INDEXES = {
+    "books_fts": ("books", ("title", "author")),
+    "users_fts": ("users", ("name", "surname", "email")),
+    "feedbacks_fts": ("feedbacks", ("review",)),
+}
+
+
+def _index_ddl(fts: str, table: str, columns: tuple[str, ...]) -> list[str]:
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{table}', "
+        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', "
+        f"prefix='2 3')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        # Index whatever rows already exist in the base table.
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def create_search_index(engine) -> None:
+    """Create the FTS5 shadow tables and their sync triggers if missing."""
+    global fts_enabled
+    with engine.connect() as conn:
+        existing = {
+            row[0]
+            for row in conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        }
+        try:
+            for fts, (table, columns) in _INDEXES.items():
+                if fts in existing:
+                    continue
+                for stmt in _index_ddl(fts, table, columns):
+                    conn.exec_driver_sql(stmt)
+                logger.info("Search index created: %s", fts)
+            conn.commit()
+        except OperationalError:
+            conn.rollback()
+            logger.warning("SQLite FTS5 is unavailable; search will use LIKE scans.")
+            return
+    fts_enabled = True
+
+
+# ── Queries ───────────────────────────────────────────────────────────────────
+
+# Highlight delimiters are control characters that cannot appear in user text,
+# so the surrounding text can be HTML-escaped before they become <mark> tags.
+_HL_OPEN, _HL_CLOSE = "\x02", "\x03"
+_TOKEN = re.compile(r"\w+")
+
+
+class Hit(NamedTuple):
+    obj: object
+    highlights: dict[str, Markup]
+
+
+def match_expression(q: str) -> str | None:
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    tokens = _TOKEN.findall(q)
+    if not tokens:
+        return None
+    return " ".join(f'"{t}"*' for t in tokens)
+
+
+def _markup(value: str | None) -> Markup:
+    if value is None:
+        return Markup("")
+    return Markup(
+        str(escape(value)).replace(_HL_OPEN, "<mark>").replace(_HL_CLOSE, "</mark>")
+    )
+
+
+def _ranked(
+    db: Session, model, fts: str, columns: str, weights: str, match: str, limit: int
+) -> list[Hit]:
+    rows = db.execute(
+        text(
+            f"SELECT rowid, {columns} FROM {fts} WHERE {fts} MATCH :match "
+            f"AND rank MATCH 'bm25({weights})' ORDER BY rank LIMIT :limit"
+        ),
+        {"match": match, "hl_open": _HL_OPEN, "hl_close": _HL_CLOSE, "limit": limit},
+    ).all()
+    if not rows:
+        return []
+    objs = {o.id: o for o in db.query(model).filter(model.id.in_([r[0] for r in rows]))}
+    return [
+        Hit(objs[r[0]], {k: _markup(v) for k, v in r._mapping.items() if k != "rowid"})
+        for r in rows
+        if r[0] in objs
+    ]
+
+
+def _highlight(fts: str, index: int, name: str) -> str:
+    return f"highlight({fts}, {index}, :hl_open, :hl_close) AS {name}"
+
+
+def _snippet(fts: str, index: int, name: str) -> str:
+    return f"snippet({fts}, {index}, :hl_open, :hl_close, '…', 16) AS {name}"
+
+
+def _plain(obj, fields: tuple[str, ...]) -> Hit:
+    return Hit(obj, {f: _markup(getattr(obj, f)) for f in fields})
+
+
+def search_books(db: Session, q: str, limit: int = SEARCH_LIMIT) -> list[Hit]:
+    match = match_expression(q)
+    if match is None:
+        return []
+    if not fts_enabled:
+        like = f"%{q}%"
+        books = (
+            db.query(Book)
+            .filter(Book.title.ilike(like) | Book.author.ilike(like))
+            .order_by(Book.title, Book.id)
+            .limit(limit)
+        )
+        return [_plain(b, ("title", "author")) for b in books]
+    columns = ", ".join(
+        [_highlight("books_fts", 0, "title"), _highlight("books_fts", 1, "author")]
+    )
+    return _ranked(db, Book, "books_fts", columns, "10.0, 5.0", match, limit)
+
+
+def search_users(db: Session, q: str, limit: int = SEARCH_LIMIT) -> list[Hit]:
+    match = match_expression(q)
+    if match is None:
+        return []
+    if not fts_enabled:
+        like = f"%{q}%"
+        users = (
+            db.query(User)
+            .filter(
+                User.name.ilike(like)
+                | User.surname.ilike(like)
+                | User.email.ilike(like)
+            )
+            .order_by(User.surname, User.name, User.id)
+            .limit(limit)
+        )
+        return [_plain(u, ("name", "surname", "email")) for u in users]
+    columns = ", ".join(
+        [
+            _highlight("users_fts", 0, "name"),
+            _highlight("users_fts", 1, "surname"),
+            _highlight("users_fts", 2, "email"),
+        ]
+    )
+    return _ranked(db, User, "users_fts", columns, "5.0, 5.0, 1.0", match, limit)
+
+
+def search_feedbacks(db: Session, q: str, limit: int = SEARCH_LIMIT) -> list[Hit]:
+    match = match_expression(q)
+    if match is None:
+        return []
+    if not fts_enabled:
+        feedbacks = (
+            db.query(Feedback)
+            .filter(Feedback.review.ilike(f"%{q}%"))
+            .order_by(Feedback.created_at.desc(), Feedback.id.desc())
+            .limit(limit)
+        )
+        return [_plain(f, ("review",)) for f in feedbacks]
+    columns = _snippet("feedbacks_fts", 0, "review")
+    return _ranked(db, Feedback, "feedbacks_fts", columns, "1.0", match, limit)
+
+
+def pick_users(db: Session, q: str, limit: int = PICKER_LIMIT) -> list[User]:
+    """Users whose name or surname starts with each word of `q`, best match
+    first: the typeahead behind the feedback form's user picker. Email
+    addresses are not searched, since any signed-in user may pick."""
+    match = match_expression(q)
+    if match is None:
+        return []
+    if not fts_enabled:
+        words = _TOKEN.findall(q)
+        query = db.query(User)
+        for word in words:
+            query = query.filter(
+                User.name.ilike(f"{word}%") | User.surname.ilike(f"{word}%")
+            )
+        return query.order_by(User.surname, User.name, User.id).limit(limit).all()
+    rows = db.execute(
+        text(
+            "SELECT rowid FROM users_fts WHERE users_fts MATCH :match "
+            "AND rank MATCH 'bm25(5.0, 5.0, 0.0)' ORDER BY rank LIMIT :limit"
+        ),
+        {"match": f"{{name surname}} : ({match})", "limit": limit},
+    ).all()
+    ids = [r[0] for r in rows]
+    users = {u.id: u for u in db.query(User).filter(User.id.in_(ids))}
+    return [users[i] for i in ids if i in users]
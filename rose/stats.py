@@ -0,0 +1,203 @@
+"""Reading statistics.
+
+Rebuild every rollup from the feedbacks table in one pass:
+
+uv run python -m rose.stats
+"""
+
+import logging
+from typing import NamedTuple
+
+from sqlalchemy.orm import Session
+
+from .models import (
+    EVERYONE,
+    RATING_BUCKETS,
+    AuthorCount,
+    RatingCount,
+    ReadingTotal,
+    ReadingYear,
+)
+
+logger = logging.getLogger("rose")
+
+TOP_AUTHORS = 10
+
+# ── Rollup maintenance ────────────────────────────────────────────────────────
+# Each change to a feedback, or to the author or page count of a book that has
+# feedbacks, is turned into a set of contribution rows (one per feedback and
+# scope: the reader and EVERYONE) which are added to or subtracted from the
+# rollups with grouped upserts. Triggers apply them in the writing
+# transaction; rebuild() applies the same statements to the whole table.
+#
+# Deleting a book subtracts its feedbacks in a BEFORE DELETE trigger, while
+# the book row is still visible; the cascaded feedback deletes that follow no
+# longer find the book and contribute nothing. Likewise a deleted user's
+# feedbacks only leave the EVERYONE totals, and the user's own rows are
+# dropped afterwards.
+
+_SCOPES = "(SELECT 0 AS everyone UNION ALL SELECT 1 AS everyone) AS scope"
+_SCOPED_USER = f"CASE WHEN scope.everyone THEN {EVERYONE} ELSE f.user_id END"
+
+
+def _feedback_rows(row: str) -> str:
+    return (
+        f"SELECT scope.user_id, {row}.year_of_reading AS year, "
+        f"{row}.rating AS rating, b.author, b.number_of_pages AS pages "
+        f"FROM books AS b, (SELECT id AS user_id FROM users "
+        f"WHERE id = {row}.user_id UNION ALL SELECT {EVERYONE}) AS scope "
+        f"WHERE b.id = {row}.book_id"
+    )
+
+
+def _book_rows(row: str) -> str:
+    return (
+        f"SELECT {_SCOPED_USER} AS user_id, f.year_of_reading AS year, "
+        f"f.rating, {row}.author AS author, {row}.number_of_pages AS pages "
+        f"FROM feedbacks AS f, {_SCOPES} WHERE f.book_id = {row}.id"
+    )
+
+
+_ALL_ROWS = (
+    f"SELECT {_SCOPED_USER} AS user_id, f.year_of_reading AS year, "
+    f"f.rating, b.author, b.number_of_pages AS pages "
+    f"FROM feedbacks AS f JOIN books AS b ON b.id = f.book_id, {_SCOPES}"
+)
+
+
+def _apply(sign: str, rows: str) -> list[str]:
+    """Statements adding (sign '') or subtracting (sign '-') `rows`."""
+    return [
+        f"INSERT INTO stats_years (user_id, year, books, pages) "
+        f"SELECT user_id, year, {sign}COUNT(*), {sign}COALESCE(SUM(pages), 0) "
+        f"FROM ({rows}) WHERE year IS NOT NULL GROUP BY user_id, year "
+        f"ON CONFLICT (user_id, year) DO UPDATE SET "
+        f"books = books + excluded.books, pages = pages + excluded.pages",
+        f"INSERT INTO stats_ratings (user_id, bucket, count) "
+        f"SELECT user_id, CAST(rating AS INTEGER), {sign}COUNT(*) "
+        f"FROM ({rows}) WHERE rating IS NOT NULL "
+        f"GROUP BY user_id, CAST(rating AS INTEGER) "
+        f"ON CONFLICT (user_id, bucket) DO UPDATE SET count = count + excluded.count",
+        f"INSERT INTO stats_authors (user_id, author, books) "
+        f"SELECT user_id, author, {sign}COUNT(*) FROM ({rows}) WHERE true "
+        f"GROUP BY user_id, author "
+        f"ON CONFLICT (user_id, author) DO UPDATE SET books = books + excluded.books",
+        f"INSERT INTO stats_totals (user_id, books) "
+        f"SELECT user_id, {sign}COUNT(*) FROM ({rows}) WHERE true GROUP BY user_id "
+        f"ON CONFLICT (user_id) DO UPDATE SET books = books + excluded.books",
+    ]
+
+
+_ROLLUPS = ("stats_years", "stats_ratings", "stats_authors", "stats_totals")
+
+_TRIGGERS = {
+    "stats_feedbacks_ai": (
+        "AFTER INSERT ON feedbacks",
+        _apply("", _feedback_rows("new")),
+    ),
+    "stats_feedbacks_ad": (
+        "AFTER DELETE ON feedbacks",
+        _apply("-", _feedback_rows("old")),
+    ),
+    "stats_feedbacks_au": (
+        "AFTER UPDATE OF user_id, book_id, rating, year_of_reading ON feedbacks",
+        _apply("-", _feedback_rows("old")) + _apply("", _feedback_rows("new")),
+    ),
+    "stats_books_bd": (
+        "BEFORE DELETE ON books",
+        _apply("-", _book_rows("old")),
+    ),
+    "stats_books_au": (
+        "AFTER UPDATE OF author, number_of_pages ON books",
+        _apply("-", _book_rows("old")) + _apply("", _book_rows("new")),
+    ),
+    "stats_users_ad": (
+        "AFTER DELETE ON users",
+        [f"DELETE FROM {table} WHERE user_id = old.id" for table in _ROLLUPS],
+    ),
+}
+
+
+def _trigger_sql(name: str) -> str:
+    event, statements = _TRIGGERS[name]
+    body = " ".join(f"{stmt};" for stmt in statements)
+    return f"CREATE TRIGGER {name} {event} BEGIN {body} END"
+
+
+def create_stats_triggers(engine) -> None:
+    """Create the rollup triggers if missing, or replace them if they predate
+    their current definition (a rollup added since), rebuilding the rollups
+    when any changed, since writes made before then are not reflected."""
+    with engine.connect() as conn:
+        existing = dict(
+            conn.exec_driver_sql(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'trigger'"
+            ).all()
+        )
+        stale = [name for name in _TRIGGERS if existing.get(name) != _trigger_sql(name)]
+        for name in stale:
+            conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {name}")
+            conn.exec_driver_sql(_trigger_sql(name))
+        conn.commit()
+    if stale:
+        logger.info("Statistics triggers created or updated: %s", ", ".join(stale))
+        rebuild(engine)
+
+
+def rebuild(engine) -> None:
+    """Recompute every rollup from scratch with set-based statements over the
+    whole feedbacks table, in one transaction."""
+    with engine.begin() as conn:
+        for table in _ROLLUPS:
+            conn.exec_driver_sql(f"DELETE FROM {table}")
+        for stmt in _apply("", _ALL_ROWS):
+            conn.exec_driver_sql(stmt)
+
+
+# ── Queries ───────────────────────────────────────────────────────────────────
+
+
+class Stats(NamedTuple):
+    books_read: int
+    years: list[ReadingYear]
+    rating_histogram: list[int]
+    top_authors: list[AuthorCount]
+
+
+def reading_stats(db: Session, user_id: int = EVERYONE) -> Stats:
+    """Statistics for one reader, or site-wide for EVERYONE. Only reads the
+    rollup rows for that scope."""
+    years = (
+        db.query(ReadingYear)
+        .filter(ReadingYear.user_id == user_id, ReadingYear.books > 0)
+        .order_by(ReadingYear.year)
+        .all()
+    )
+    histogram = [0] * RATING_BUCKETS
+    for bucket, count in db.query(RatingCount.bucket, RatingCount.count).filter(
+        RatingCount.user_id == user_id
+    ):
+        histogram[bucket] = count
+    authors = (
+        db.query(AuthorCount)
+        .filter(AuthorCount.user_id == user_id, AuthorCount.books > 0)
+        .order_by(AuthorCount.books.desc(), AuthorCount.author)
+        .limit(TOP_AUTHORS)
+        .all()
+    )
+    books_read = (
+        db.query(ReadingTotal.books).filter(ReadingTotal.user_id == user_id).scalar()
+        or 0
+    )
+    return Stats(books_read, years, histogram, authors)
+
+
+def main() -> None:
+    from .database import engine
+
+    rebuild(engine)
+    print("Reading statistics rebuilt")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.orm import Session
+
+from . import queries
+from .database import SQLITE_PRAGMAS
+from .models import Book, Feedback, Tombstone, User
+from .pagination import decode_cursor, encode_cursor
+
+logger = logging.getLogger("rose")
+
+SYNC_LIMIT = 500
+
+# A row's updated_at is taken just before its write statement runs, which may
+# then wait up to busy_timeout for the lock before committing. Rows are only
+# handed out once they are older than that, so a keyset cursor over
+# (updated_at, id) can never step past a row that commits late.
+SETTLE = timedelta(
+    seconds=float(
+        os.environ.get("SYNC_SETTLE_SECONDS", SQLITE_PRAGMAS["busy_timeout"] / 1000 + 1)
+    )
+)
+
+# Tombstones older than this are pruned. A cursor that has not caught up
+# with them gets a 410 and must start a full sync again.
+# 0 keeps every tombstone.
+TOMBSTONE_RETENTION = timedelta(
+    days=float(os.environ.get("SYNC_TOMBSTONE_RETENTION_DAYS", 30))
+)
+PRUNE_INTERVAL = 3600
+
+_TABLES = {"books": Book, "feedbacks": Feedback, "users": User}
+
+# ── Tombstone triggers ────────────────────────────────────────────────────────
+# Deletes are recorded by triggers rather than by the route handlers so that
+# rows removed by cascades or bulk statements leave a tombstone as well.
+
+
+def create_sync_triggers(engine) -> None:
+    with engine.connect() as conn:
+        for table in _TABLES:
+            conn.exec_driver_sql(
+                f"CREATE TRIGGER IF NOT EXISTS {table}_tombstone "
+                f"AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO tombstones (table_name, row_id, deleted_at) "
+                f"VALUES ('{table}', old.id, CURRENT_TIMESTAMP); END"
+            )
+        conn.commit()
+
+
+def prune_tombstones(engine) -> int:
+    """Delete tombstones past TOMBSTONE_RETENTION; returns how many.
+
+    Whole id ranges are removed from the oldest up, so the ids that remain
+    are contiguous and the lowest of them tells which cursors have expired.
+    The newest tombstone is always kept to mark where the ids have got to.
+    """
+    cutoff = datetime.utcnow() - TOMBSTONE_RETENTION
+    with engine.begin() as conn:
+        expired = conn.scalar(
+            select(func.max(Tombstone.id)).where(Tombstone.deleted_at < cutoff)
+        )
+        if expired is None:
+            return 0
+        newest = conn.scalar(select(func.max(Tombstone.id)))
+        stmt = delete(Tombstone).where(Tombstone.id <= expired, Tombstone.id < newest)
+        return conn.execute(stmt).rowcount
+
+
+def _tombstone_range(db: Session) -> tuple[int, int]:
+    """The last pruned tombstone id and the last id assigned."""
+    # Two queries: SQLite only answers a lone min() or max() from the index.
+    oldest = db.scalar(select(func.min(Tombstone.id)))
+    last = db.scalar(select(func.max(Tombstone.id)))
+    return (oldest or 1) - 1, last or 0
+
+
+# ── Change feed ───────────────────────────────────────────────────────────────
+
+
+class Changes(NamedTuple):
+    books: list[Book]
+    feedbacks: list[Feedback]
+    users: list[User]
+    deleted: dict[str, list[int]]
+    cursor: str
+    has_more: bool
+
+
+def _position(cursor: str | None) -> dict:
+    """Decode a sync cursor into per-table (updated_at, id) keys plus the last
+    tombstone id. An empty cursor starts from the beginning (tombstones are
+    left at None, for changes_since to fill in)."""
+    start = {table: None for table in _TABLES} | {"tombstones": None}
+    if not cursor:
+        return start
+    values = decode_cursor(cursor)
+    if len(values) != 2 * len(_TABLES) + 1:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        for i, table in enumerate(_TABLES):
+            ts, row_id = values[2 * i], values[2 * i + 1]
+            if ts is not None:
+                start[table] = (datetime.fromisoformat(ts), int(row_id))
+        start["tombstones"] = int(values[-1])
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return start
+
+
+def changes_since(
+    db: Session, cursor: str | None, limit: int, include_users: bool
+) -> Changes:
+    """Rows created, updated or deleted after `cursor`, at most `limit` per
+    table. Each table is read by keyset on (updated_at, id), so the cost is
+    proportional to the number of changes returned.
+
+    Ids are never reused (see rose/models.py), so a deleted id stays deleted
+    and a client may apply `deleted` and the rows in either order.
+    """
+    position = _position(cursor)
+    pruned, last = _tombstone_range(db)
+    if position["tombstones"] is None:
+        # A full sync has no copies to delete yet; it only needs the
+        # deletions that happen from here on.
+        position["tombstones"] = last
+    elif position["tombstones"] < pruned:
+        raise HTTPException(
+            status_code=410, detail="Cursor expired, sync again without since"
+        )
+    settled = datetime.utcnow() - SETTLE
+    has_more = False
+    rows: dict[str, list] = {}
+
+    for table, model in _TABLES.items():
+        if table == "users" and not include_users:
+            rows[table] = []
+            continue
+        query = queries.feedback_query(db) if model is Feedback else db.query(model)
+        query = query.filter(model.updated_at <= settled)
+        if position[table] is not None:
+            query = query.filter(
+                tuple_(model.updated_at, model.id) > tuple_(*position[table])
+            )
+        found = query.order_by(model.updated_at, model.id).limit(limit + 1).all()
+        if len(found) > limit:
+            found = found[:limit]
+            has_more = True
+        if found:
+            position[table] = (found[-1].updated_at, found[-1].id)
+        rows[table] = found
+
+    tombstones = db.query(Tombstone).filter(Tombstone.id > position["tombstones"])
+    if not include_users:
+        tombstones = tombstones.filter(Tombstone.table_name != "users")
+    tombstones = tombstones.order_by(Tombstone.id).limit(limit + 1).all()
+    if len(tombstones) > limit:
+        tombstones = tombstones[:limit]
+        has_more = True
+    deleted: dict[str, list[int]] = {table: [] for table in _TABLES}
+    for t in tombstones:
+        deleted[t.table_name].append(t.row_id)
+    if tombstones:
+        position["tombstones"] = tombstones[-1].id
+
+    values = []
+    for table in _TABLES:
+        values.extend(position[table] or (None, None))
+    values.append(position["tombstones"])
+    return Changes(
+        rows["books"],
+        rows["feedbacks"],
+        rows["users"],
+        deleted,
+        encode_cursor(values),
+        has_more,
+    )
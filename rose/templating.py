@@ -0,0 +1,82 @@
+"""The one Jinja environment every router renders with.
+
+Compiled templates are kept in a filesystem bytecode cache shared by all
+workers and restarts, and precompile() loads every template at startup, so
+no live request pays for parsing and compiling one.
+"""
+
+import os
+import tempfile
+import time
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
+
+from . import metrics
+from .assets import static_url
+
+TEMPLATES_DIR = os.environ.get("TEMPLATES_DIR", "templates")
+# Set to 1 in development to pick up template edits without a restart; each
+# render then stats the template's source file.
+TEMPLATE_RELOAD = os.environ.get("TEMPLATE_RELOAD", "0") == "1"
+TEMPLATE_PRECOMPILE = os.environ.get("TEMPLATE_PRECOMPILE", "1") == "1"
+TEMPLATE_CACHE_DIR = os.environ.get(
+    "TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "rose-jinja")
+)
+
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+
+
+class TimedTemplate(Template):
+    """Adds the time spent rendering to the current request's timings.
+    Included templates render inside their parent, so are not counted twice."""
+
+    def render(self, *args, **kwargs) -> str:
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            if (timings := metrics.current()) is not None:
+                timings.render += time.perf_counter() - start
+
+
+env = Environment(
+    loader=FileSystemLoader(TEMPLATES_DIR),
+    autoescape=True,
+    auto_reload=TEMPLATE_RELOAD,
+    # Never evict: the whole template set is small and always in use.
+    cache_size=-1,
+    bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR),
+)
+env.template_class = TimedTemplate
+env.globals["static_url"] = static_url
+
+templates = Jinja2Templates(env=env)
+
+
+def precompile() -> tuple[int, float]:
+    """Load every template (partials included) into the environment's cache.
+    Returns how many were loaded and the seconds it took."""
+    started = time.perf_counter()
+    names = env.list_templates(extensions=["html"])
+    for name in names:
+        env.get_template(name)
+    return len(names), time.perf_counter() - started
+
+
+# ── htmx fragments ────────────────────────────────────────────────────────────
+# Write routes serve both API clients and htmx forms. An htmx request (sent
+# with HX-Request: true) gets the rendered fragment it swaps into the page,
+# plus out-of-band copies of any counters the write changed, instead of JSON.
+
+
+def is_htmx(request: Request) -> bool:
+    return request.headers.get("HX-Request") == "true"
+
+
+def fragment(
+    request: Request, name: str, context: dict, status_code: int = 200
+) -> HTMLResponse:
+    return templates.TemplateResponse(request, name, context, status_code=status_code)
@@ -0,0 +1,120 @@
+"""Running several worker processes against one database.
+
+`uvicorn --workers N` starts N copies of the app, each with its own memory.
+What they must agree on lives in the database instead: the session signing
+key and ETag epoch are kept in the settings table (created by whichever
+process gets there first), and write versions in table_versions (see
+rose/cache.py). Startup work that changes the schema runs under an
+exclusive lock on a file next to the database, so workers take turns: the
+first applies migrations and builds indexes, the rest find nothing to do.
+"""
+
+import logging
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from .database import DB_PATH
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, where only one worker is supported
+    fcntl = None
+
+logger = logging.getLogger("rose")
+
+_settings: dict[str, str] = {}
+
+
+# ── File locks ────────────────────────────────────────────────────────────────
+
+
+def _lock_path(name: str) -> str:
+    return f"{DB_PATH}.{name}.lock"
+
+
+@contextmanager
+def startup_lock() -> Iterator[None]:
+    """Hold an exclusive lock shared by every process using this database,
+    waiting for it if another one holds it."""
+    if fcntl is None:
+        yield
+        return
+    with open(_lock_path("startup"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def try_lock(name: str) -> Iterator[bool]:
+    """Take the lock `name` if no other process holds it; yields whether
+    this one got it. For periodic jobs one worker is enough to run."""
+    if fcntl is None:
+        yield True
+        return
+    with open(_lock_path(name), "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+# ── Shared settings ───────────────────────────────────────────────────────────
+
+_CREATE_SETTINGS = (
+    "CREATE TABLE IF NOT EXISTS settings "
+    "(name VARCHAR(64) PRIMARY KEY, value TEXT NOT NULL)"
+)
+
+
+def _read(conn, name: str) -> str | None:
+    return conn.exec_driver_sql(
+        "SELECT value FROM settings WHERE name = ?", (name,)
+    ).scalar()
+
+
+def get_setting(engine, name: str) -> str | None:
+    with engine.connect() as conn:
+        exists = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'settings'"
+        ).scalar()
+        return _read(conn, name) if exists else None
+
+
+def put_setting(engine, name: str, value: str) -> None:
+    with engine.begin() as conn:
+        conn.exec_driver_sql(_CREATE_SETTINGS)
+        conn.exec_driver_sql(
+            "INSERT INTO settings (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+            (name, value),
+        )
+
+
+def shared_setting(engine, name: str, make: Callable[[], str]) -> str:
+    """The value stored under `name`, storing make() first if there is none.
+
+    Workers starting together may each call make(), but only the first
+    insert is kept and every one of them returns that value. Read before
+    writing: a worker migrating the database under the startup lock holds
+    the write lock, and readers are not kept waiting by it.
+    """
+    value = _settings.get(name) or get_setting(engine, name)
+    if value is None:
+        with startup_lock(), engine.begin() as conn:
+            conn.exec_driver_sql(_CREATE_SETTINGS)
+            conn.exec_driver_sql(
+                "INSERT OR IGNORE INTO settings (name, value) VALUES (?, ?)",
+                (name, make()),
+            )
+            value = _read(conn, name)
+        logger.info("Stored a new %s in the database", name)
+    _settings[name] = value
+    return value
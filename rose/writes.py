@@ -0,0 +1,178 @@
+"""Group commit: one writer applies every mutation, in shared transactions.
+
+SQLite has a single write lock. When each request commits on its own, the
+threads serving concurrent writes queue up on that lock, each paying for a
+whole transaction, and past busy_timeout they fail with "database is
+locked". Instead, write routes hand their unit of work to submit(). One
+writer task applies whatever has been submitted in a single transaction,
+each unit inside its own SAVEPOINT. While writes keep arriving it also
+waits up to WRITE_BATCH_WINDOW_MS after the first for more to join (at most
+WRITE_BATCH_MAX); a lone write is applied at once. A unit that raises (a 404,
+or the 409 for a duplicate email) is rolled back alone and its caller gets
+the exception, while the rest of the batch commits together.
+
+Units are written like those passed to database.run(): fn(session, ...)
+against a plain Session, with anything the caller reads loaded before
+returning. They must not commit; they flush when they need generated ids
+or columns set by triggers. As with run(), in async mode (DB_ASYNC=1) a
+batch goes through aiosqlite via AsyncSession.run_sync; otherwise it is sent
+to the threadpool.
+"""
+
+import asyncio
+import contextvars
+import logging
+import os
+from typing import Any, Callable, TypeVar
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import metrics
+from .database import DB_ASYNC, AsyncWriteSessionLocal, WriteSessionLocal
+
+logger = logging.getLogger("rose")
+
+# Set to 0 to commit each write on its own, from the request's worker thread.
+WRITE_QUEUE = os.environ.get("WRITE_QUEUE", "1") == "1"
+# How long the writer waits after a first write for others to join it.
+BATCH_WINDOW = float(os.environ.get("WRITE_BATCH_WINDOW_MS", 2)) / 1000
+BATCH_MAX = int(os.environ.get("WRITE_BATCH_MAX", 64))
+
+T = TypeVar("T")
+
+
+class _Write:
+    __slots__ = ("fn", "args", "kwargs", "context", "future", "result", "error")
+
+    def __init__(self, fn, args, kwargs, future):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        # The submitting request's context, so the SQL it causes counts
+        # towards that request's timings.
+        self.context = contextvars.copy_context()
+        self.future = future
+        self.result = None
+        self.error: BaseException | None = None
+
+    def apply(self, db: Session) -> None:
+        try:
+            with db.begin_nested():
+                self.result = self.fn(db, *self.args, **self.kwargs)
+                db.flush()
+        except Exception as exc:
+            self.error = exc
+
+
+def _apply_batch(db: Session, batch: list[_Write]) -> None:
+    for write in batch:
+        write.context.run(write.apply, db)
+    db.commit()
+
+
+def _apply_in_thread(batch: list[_Write]) -> None:
+    db = WriteSessionLocal()
+    try:
+        _apply_batch(db, batch)
+    finally:
+        db.close()
+
+
+async def _apply(batch: list[_Write]) -> None:
+    """Run a batch in one transaction, one SAVEPOINT per write."""
+    try:
+        if DB_ASYNC:
+            async with AsyncWriteSessionLocal() as db:
+                await db.run_sync(_apply_batch, batch)
+        else:
+            await run_in_threadpool(_apply_in_thread, batch)
+    except Exception as exc:
+        # The commit itself failed (closing the session rolled it back), so
+        # none of the batch was written.
+        for write in batch:
+            if write.error is None:
+                write.result, write.error = None, exc
+
+
+class WriteQueue:
+    def __init__(self):
+        self._queue: asyncio.Queue[_Write | None] | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Apply what is already queued, then stop the writer."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._queue = self._task = None
+
+    async def submit(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Apply fn(session, *args, **kwargs) and return its result once the
+        transaction it went into has committed, or raise what it raised."""
+        write = _Write(fn, args, kwargs, asyncio.get_running_loop().create_future())
+        if self._task is None:
+            # Per-request commits: disabled, or outside the app's lifespan.
+            await _apply([write])
+            _settle(write)
+        else:
+            await self._queue.put(write)
+        return await write.future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        busy = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            # A lone write goes straight through; the window is only worth
+            # waiting for while writes are arriving concurrently.
+            window = BATCH_WINDOW if busy or not self._queue.empty() else 0
+            deadline = loop.time() + window
+            while len(batch) < BATCH_MAX:
+                try:
+                    timeout = deadline - loop.time()
+                    if timeout > 0:
+                        write = await asyncio.wait_for(self._queue.get(), timeout)
+                    else:
+                        write = self._queue.get_nowait()
+                except (TimeoutError, asyncio.QueueEmpty):
+                    break
+                if write is None:
+                    stopping = True
+                    break
+                batch.append(write)
+            try:
+                await _apply(batch)
+            except Exception as exc:
+                logger.exception("Write batch failed")
+                for write in batch:
+                    write.error = write.error or exc
+            metrics.registry.write_batches.observe((), len(batch))
+            busy = len(batch) > 1
+            for write in batch:
+                _settle(write)
+
+
+def _settle(write: _Write) -> None:
+    if write.future.done():  # the caller went away
+        return
+    if write.error is not None:
+        write.future.set_exception(write.error)
+    else:
+        write.future.set_result(write.result)
+
+
+queue = WriteQueue()
+
+
+async def submit(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    return await queue.submit(fn, *args, **kwargs)